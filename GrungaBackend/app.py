@@ -1,4 +1,4 @@
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify
 from flask_cors import CORS
 import os
 import sys
@@ -7,12 +7,32 @@ from routes.workouts import bpWorkouts
 from routes.friendsRoutes import friendsBlueprint
 from routes.users import bpUsers
 from routes.badges import bpBadges
+from routes.admin import bpAdmin
+from routes.events import bpEvents
+from cli import registerCommands
+from config import SCHEDULER_ENABLED, SERVER_TIMING
+from services.connection import initUnitOfWork
+from services.pagination import NEXT_CURSOR_HEADER
+from services.metrics_service import initMetrics, renderPrometheus
+
+
+def _isServing() -> bool:
+    """False when loaded by a `flask` CLI command other than `flask run`."""
+    prog = sys.argv[0] if sys.argv else ""
+    isFlaskCli = (
+        os.path.basename(prog) in ("flask", "flask.exe")
+        or prog.endswith(os.path.join("flask", "__main__.py"))
+    )
+    return not isFlaskCli or "run" in sys.argv[1:]
 
 
 def createApp():
     app = Flask(__name__)
 
-    CORS(app, supports_credentials=True)
+    CORS(app, supports_credentials=True, expose_headers=[NEXT_CURSOR_HEADER, "Server-Timing"])
+    # Registered first so its after_request hook runs last
+    initMetrics(app, serverTiming=SERVER_TIMING)
+    initUnitOfWork(app)
 
     @app.route("/")
     def home():
@@ -26,27 +46,46 @@ def createApp():
     def health():
         return jsonify({"ok": True})
 
+    # Prometheus scrape target (series are per worker process)
+    @app.route("/api/metrics")
+    def metrics():
+        return Response(renderPrometheus(), mimetype="text/plain; version=0.0.4")
+
     app.register_blueprint(bpWorkouts, url_prefix="/api")
     app.register_blueprint(bpUsers, url_prefix="/api/users")
     app.register_blueprint(friendsBlueprint, url_prefix="/api/friends")
     app.register_blueprint(challengesBlueprint, url_prefix="/api/challenges")
     app.register_blueprint(bpBadges, url_prefix="/api/badges")
+    app.register_blueprint(bpAdmin, url_prefix="/api/admin")
+    app.register_blueprint(bpEvents, url_prefix="/api/events")
 
-    return app
-
-
-app = createApp()
+    registerCommands(app)
 
+    # Load the schema registry up front; if the DB isn't reachable yet it
+    # is loaded lazily on first use instead.
+    try:
+        from services.schema_service import refreshSchema
+        refreshSchema()
+    except Exception as e:
+        print("Schema registry not loaded at startup:", e)
 
-if __name__ == "__main__":
-    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+    # Every serving process (each gunicorn worker, each container) joins
+    # the scheduler election; only the GET_LOCK holder runs the jobs.
+    # `flask <command>` maintenance runs stay out of it.
+    if SCHEDULER_ENABLED and _isServing():
         try:
             from services.scheduler_service import startScheduler
-            print("Starting DAILY scheduler...")
             startScheduler("America/Chicago")
         except Exception as e:
             print("Scheduler failed:", e)
 
+    return app
+
+
+app = createApp()
+
+
+if __name__ == "__main__":
     host = os.environ.get("HOST", "127.0.0.1")
     port = int(os.environ.get("PORT", "5000"))
     app.run(host=host, port=port, debug=True)
\ No newline at end of file
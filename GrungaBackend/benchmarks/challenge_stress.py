@@ -0,0 +1,185 @@
+"""
+Challenge transition concurrency stress test.
+
+Creates two throwaway users and, for each round, one PENDING challenge
+between them. It then fires --threads concurrent accept_challenge calls
+and --threads concurrent complete_challenge calls at the same challenge.
+Every round must have exactly one winning accept and one winning complete,
+and exactly two ledger rows.
+
+A second phase then runs --rounds same-user rounds: half the threads
+complete different ACTIVE challenges between the same two users while the
+other half log workouts for them, all released at once. Every call must
+succeed (a deadlock or lock-wait timeout is a failure). Both users'
+totalPoints must equal the sum of the awards and workout points.
+
+    cd GrungaBackend
+    DB_NAME=grunga_bench python -m benchmarks.challenge_stress --rounds 200 --threads 8
+
+Run it against a scratch database with schema.sql applied. Exits non-zero
+if any check fails. The seeded users (and everything cascading from them)
+are deleted at the end unless --keep is given.
+"""
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from services.connection import POOL, db_cursor as dbCursor
+from services.challenges_service import accept_challenge, complete_challenge
+from services.points_service import applyPointsDelta, pointsForRow, nowCt
+
+SETS, REPS = 3, 10
+POINTS = SETS * REPS
+WORKOUT_TYPE = "pushups"
+WORKOUT_POINTS = pointsForRow(SETS, REPS, WORKOUT_TYPE)
+
+
+def _createUsers():
+    tag = int(time.time() * 1000)
+    ids = []
+    with dbCursor(commit=True) as db:
+        for role in ("from", "to"):
+            db.execute(
+                "INSERT INTO users (username, displayName) VALUES (%s, %s)",
+                (f"stress_{role}_{tag}", f"Stress {role.title()} {tag}"),
+            )
+            ids.append(db.lastRowId())
+    return ids
+
+
+def _createChallenge(fromId, toId, status="PENDING"):
+    with dbCursor(commit=True) as db:
+        db.execute("""
+            INSERT INTO challenges (fromUserId, toUserId, exerciseType, sets, reps, points, status, createdAt, dueAt)
+            VALUES (%s, %s, 'pushups', %s, %s, %s, %s, NOW(), NOW() + INTERVAL 1 DAY)
+        """, (fromId, toId, SETS, REPS, POINTS, status))
+        return db.lastRowId()
+
+
+def _logWorkout(userId):
+    """The write POST /api/users/<id>/workouts makes, minus the HTTP layer."""
+    today = nowCt().date()
+    with dbCursor(commit=True) as db:
+        db.execute("""
+            INSERT INTO workouts (userId, workoutType, sets, reps, workoutDate, points)
+            VALUES (%s,%s,%s,%s,%s,%s)
+        """, (userId, WORKOUT_TYPE, SETS, REPS, today, WORKOUT_POINTS))
+        applyPointsDelta(db, userId, [(today, WORKOUT_POINTS)])
+    return {"ok": True}
+
+
+def _raceAll(pool, calls):
+    """Runs every (fn, *args) in `calls` on its own worker, released at the same moment."""
+    barrier = threading.Barrier(len(calls))
+
+    def call(fn, *args):
+        barrier.wait()
+        try:
+            return fn(*args)
+        except Exception as e:
+            return {"ok": False, "error": f"{fn.__name__}: {e}"}
+
+    futures = [pool.submit(call, *c) for c in calls]
+    return [f.result() for f in futures]
+
+
+def _race(pool, threads, fn, *args):
+    """Runs fn(*args) on `threads` workers released at the same moment."""
+    return _raceAll(pool, [(fn, *args)] * threads)
+
+
+def _sameUserRound(pool, threads, fromId, toId):
+    """
+    Different challenges between the same pair completed at once, next to
+    workouts logged for both users. Returns [(call, result)].
+    """
+    completes = max(1, threads // 2)
+    calls = [(complete_challenge, _createChallenge(fromId, toId, "ACTIVE"), toId) for _ in range(completes)]
+    calls += [(_logWorkout, (toId, fromId)[i % 2]) for i in range(threads - completes)]
+    return list(zip(calls, _raceAll(pool, calls)))
+
+
+def _ledgerRows(challengeId):
+    with dbCursor() as db:
+        db.execute("SELECT COUNT(*) AS n FROM pointsLedger WHERE refId = %s", (str(challengeId),))
+        return int(db.fetchOne()["n"])
+
+
+def _totalPoints(userId):
+    with dbCursor() as db:
+        db.execute("SELECT totalPoints FROM pointsTotals WHERE userId = %s", (userId,))
+        row = db.fetchOne()
+    return int(row["totalPoints"]) if row else 0
+
+
+def _cleanup(userIds):
+    with dbCursor(commit=True) as db:
+        db.execute("DELETE FROM users WHERE userId IN (%s, %s)", tuple(userIds))
+        db.execute("DELETE FROM userRevisions WHERE userId IN (%s, %s)", tuple(userIds))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=100)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--keep", action="store_true", help="keep the seeded users")
+    args = parser.parse_args()
+
+    # Each call holds one pool connection; more threads would exhaust the pool
+    threads = max(2, min(args.threads, POOL.pool_size))
+    fromId, toId = _createUsers()
+    failures = []
+    expected = {fromId: 0, toId: 0}
+    started = time.perf_counter()
+
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            for n in range(args.rounds):
+                challengeId = _createChallenge(fromId, toId)
+
+                accepted = sum(r["ok"] for r in _race(pool, threads, accept_challenge, challengeId, toId))
+                completed = sum(r["ok"] for r in _race(pool, threads, complete_challenge, challengeId, toId))
+                ledger = _ledgerRows(challengeId)
+
+                if (accepted, completed, ledger) != (1, 1, 2):
+                    failures.append(
+                        f"round {n} challenge {challengeId}: "
+                        f"{accepted} accepts, {completed} completes, {ledger} ledger rows"
+                    )
+                if completed:
+                    expected[fromId] += POINTS
+                    expected[toId] += POINTS * 2
+
+            for n in range(args.rounds):
+                for call, r in _sameUserRound(pool, threads, fromId, toId):
+                    if not r["ok"]:
+                        failures.append(f"same-user round {n}: {r.get('error') or r.get('message')}")
+                    elif call[0] is _logWorkout:
+                        expected[call[1]] += WORKOUT_POINTS
+                    else:
+                        expected[fromId] += POINTS
+                        expected[toId] += POINTS * 2
+
+        elapsed = time.perf_counter() - started
+        for uid, want in expected.items():
+            got = _totalPoints(uid)
+            if got != want:
+                failures.append(f"user {uid}: totalPoints {got}, expected {want}")
+    finally:
+        if not args.keep:
+            _cleanup((fromId, toId))
+
+    print(f"{args.rounds} transition + {args.rounds} same-user rounds x {threads} threads in {elapsed:.1f}s")
+    if failures:
+        print(f"FAILED ({len(failures)}):")
+        for f in failures:
+            print("  " + f)
+        sys.exit(1)
+    print("OK: one accept, one complete and two ledger rows per challenge; "
+          "no same-user deadlocks; totals match")
+
+
+if __name__ == "__main__":
+    main()
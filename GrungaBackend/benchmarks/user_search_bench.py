@@ -0,0 +1,118 @@
+"""
+User search latency benchmark.
+
+Seeds synthetic users into the configured database and times
+services.search_service for exact, prefix, substring and 1-character
+queries, on the FULLTEXT path and on the LIKE fallback.
+
+    cd GrungaBackend
+    DB_NAME=grunga_bench python -m benchmarks.user_search_bench --users 100000
+    DB_NAME=grunga_bench python -m benchmarks.user_search_bench --users 1000000
+
+Run it against a scratch database with schema.sql applied. Seeded rows use
+the "bench_" username prefix; they are deleted at the end unless --keep is
+given (a later run with a larger --users only inserts the missing rows).
+"""
+import argparse
+import random
+import statistics
+import time
+
+from services.connection import db_cursor as dbCursor
+from services.schema_service import hasIndex
+from services import search_service
+
+FIRST = ["alex", "sam", "jordan", "taylor", "morgan", "casey", "riley", "jamie",
+         "avery", "quinn", "drew", "blake", "reese", "skyler", "rowan", "emery"]
+LAST = ["smith", "garcia", "nguyen", "kowalski", "okafor", "schmidt", "rossi",
+        "tanaka", "silva", "novak", "haddad", "murphy", "larsen", "ivanova"]
+
+FIELDS = "userId, username, displayName"
+
+
+def _benchUserCount():
+    with dbCursor() as db:
+        db.execute("SELECT COUNT(*) AS n FROM users WHERE username LIKE 'bench\\_%'")
+        return int(db.fetchOne()["n"])
+
+
+def seed(target, batch=5000):
+    have = _benchUserCount()
+    rng = random.Random(have)
+    started = time.perf_counter()
+    for start in range(have, target, batch):
+        rows = []
+        for n in range(start, min(start + batch, target)):
+            first, last = rng.choice(FIRST), rng.choice(LAST)
+            rows.append((f"bench_u{n}", f"{first.title()} {last.title()} {n}"))
+        with dbCursor(commit=True) as db:
+            db.executemany("INSERT INTO users (username, displayName) VALUES (%s, %s)", rows)
+    if target > have:
+        print(f"seeded {target - have} users in {time.perf_counter() - started:.1f}s")
+
+
+def cleanup(batch=10000):
+    while True:
+        with dbCursor(commit=True) as db:
+            db.execute("DELETE FROM users WHERE username LIKE 'bench\\_%' LIMIT %s", (batch,))
+            if db.rowCount() < batch:
+                break
+
+
+def _sampleQueries(total, count):
+    rng = random.Random(42)
+    cases = {"exact": [], "prefix": [], "substring": [], "one-char": []}
+    for _ in range(count):
+        n = rng.randrange(total)
+        first = rng.choice(FIRST)
+        cases["exact"].append(f"bench_u{n}")
+        cases["prefix"].append(first.title()[:4])
+        cases["substring"].append(rng.choice(LAST)[1:5])
+        cases["one-char"].append(first[0])
+    return cases
+
+
+def _time(fn, queries):
+    samples = []
+    for q in queries:
+        t0 = time.perf_counter()
+        fn(q, FIELDS, None, 20, 0)
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return {
+        "p50": statistics.median(samples),
+        "p95": samples[int(len(samples) * 0.95) - 1],
+        "max": samples[-1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--keep", action="store_true", help="keep the seeded users")
+    args = parser.parse_args()
+
+    seed(args.users)
+    cases = _sampleQueries(args.users, args.queries)
+
+    paths = [("LIKE fallback", search_service.searchUsersLike)]
+    if hasIndex("users", search_service.USER_SEARCH_INDEX):
+        paths.insert(0, ("FULLTEXT", search_service.searchUsersFulltext))
+    else:
+        print("ft_users_search missing: only the LIKE fallback is measured")
+
+    print(f"\n{args.users} bench users, {args.queries} queries per case (ms)")
+    print(f"{'path':<14} {'case':<10} {'p50':>8} {'p95':>8} {'max':>8}")
+    for name, fn in paths:
+        for case, queries in cases.items():
+            # 1-char queries always take the prefix path (shorter than an ngram)
+            stats = _time(search_service.searchUsersPrefix if case == "one-char" else fn, queries)
+            print(f"{name:<14} {case:<10} {stats['p50']:8.2f} {stats['p95']:8.2f} {stats['max']:8.2f}")
+
+    if not args.keep:
+        cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import click
+from services.connection import fetchAll, db_cursor as dbCursor
+
+
+def registerCommands(app):
+    """
+    Maintenance commands, run with `flask --app app <command>`.
+    """
+
+    @app.cli.command("recompute-totals")
+    @click.option("--user-id", type=int, default=None,
+                  help="Only repair this user (default: every user).")
+    def recomputeTotalsCommand(user_id):
+        """Rebuild pointsTotals from the full workout/ledger history."""
+        from services.points_service import recomputeTotalsForUser
+
+        if user_id is not None:
+            userIds = [user_id]
+        else:
+            userIds = [r["userId"] for r in fetchAll("SELECT userId FROM users ORDER BY userId")]
+
+        for uid in userIds:
+            totals = recomputeTotalsForUser(uid)
+            click.echo(f"user {uid}: total={totals['total']} weekly={totals['weekly']} daily={totals['daily']}")
+
+        click.echo(f"Recomputed totals for {len(userIds)} user(s).")
+
+    @app.cli.command("backfill-workout-points")
+    @click.option("--batch-size", type=int, default=1000, show_default=True)
+    def backfillWorkoutPointsCommand(batch_size):
+        """Score every workout row and store the result in workouts.points."""
+        from services.points_service import scoreWorkouts
+
+        lastId = 0
+        updated = 0
+        while True:
+            with dbCursor(commit=True) as db:
+                db.execute("""
+                    SELECT workoutId, sets, reps, workoutType
+                    FROM workouts
+                    WHERE workoutId > %s
+                    ORDER BY workoutId
+                    LIMIT %s
+                """, (lastId, batch_size))
+                rows = db.fetchAll() or []
+                if not rows:
+                    break
+
+                points = scoreWorkouts(rows)
+                db.executemany(
+                    "UPDATE workouts SET points=%s WHERE workoutId=%s",
+                    [(p, r["workoutId"]) for p, r in zip(points, rows)]
+                )
+
+            lastId = rows[-1]["workoutId"]
+            updated += len(rows)
+            click.echo(f"scored {updated} workouts (last workoutId={lastId})")
+
+        click.echo(f"Backfilled points for {updated} workout(s).")
+
+    @app.cli.command("expire-challenges")
+    @click.option("--batch-size", type=int, default=None,
+                  help="Rows per UPDATE (default: CHALLENGE_EXPIRY_BATCH).")
+    def expireChallengesCommand(batch_size):
+        """Expire overdue PENDING challenges now."""
+        from services.scheduler_service import expireChallenges
+
+        click.echo(f"Expired {expireChallenges(batch_size)} challenge(s).")
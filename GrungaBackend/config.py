@@ -9,3 +9,57 @@ DB_CONFIG = {
     "pool_name": "grunga_pool",
     "pool_size": 5,
 }
+
+# Nightly daily/weekly rollover: userId range per chunk and number of
+# worker processes (1 = run chunks in the scheduler thread).
+ROLLOVER_CHUNK_SIZE = int(os.getenv("ROLLOVER_CHUNK_SIZE", "5000"))
+ROLLOVER_WORKERS = int(os.getenv("ROLLOVER_WORKERS", "1"))
+
+# Seconds a user's friends leaderboard stays cached (writes invalidate it sooner).
+LEADERBOARD_CACHE_TTL = int(os.getenv("LEADERBOARD_CACHE_TTL", "60"))
+
+# Seconds a user's in-process friendship index entry is trusted before it
+# is reloaded (picks up friend changes made by other workers).
+FRIEND_GRAPH_TTL = int(os.getenv("FRIEND_GRAPH_TTL", "300"))
+
+# X-Demo-User -> userId cache (per worker). Misses are kept for a shorter time.
+IDENTITY_CACHE_SIZE = int(os.getenv("IDENTITY_CACHE_SIZE", "10000"))
+IDENTITY_CACHE_TTL = int(os.getenv("IDENTITY_CACHE_TTL", "300"))
+IDENTITY_MISS_TTL = int(os.getenv("IDENTITY_MISS_TTL", "10"))
+
+# Token required in X-Admin-Token for /api/admin endpoints (unset = disabled).
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Streamed exports running at once per worker. Each holds a pool
+# connection for the whole download, so this stays below DB_POOL_SIZE.
+EXPORT_MAX_CONCURRENT = int(os.getenv("EXPORT_MAX_CONCURRENT", "2"))
+
+# Max workouts accepted by one POST /api/users/<id>/workouts/bulk call.
+BULK_WORKOUT_MAX = int(os.getenv("BULK_WORKOUT_MAX", "5000"))
+
+# Challenge expiry: seconds between sweeps and rows expired per UPDATE.
+CHALLENGE_EXPIRY_INTERVAL = int(os.getenv("CHALLENGE_EXPIRY_INTERVAL", "60"))
+CHALLENGE_EXPIRY_BATCH = int(os.getenv("CHALLENGE_EXPIRY_BATCH", "1000"))
+
+# Background side-effect worker (badge checks, recomputes), per process.
+WORKER_THREADS = int(os.getenv("WORKER_THREADS", "2"))
+WORKER_QUEUE_MAX = int(os.getenv("WORKER_QUEUE_MAX", "10000"))
+WORKER_DRAIN_TIMEOUT = int(os.getenv("WORKER_DRAIN_TIMEOUT", "10"))
+
+# Server-sent events (per worker): max open streams, seconds between
+# keepalive comments, seconds between cross-worker revision polls, and
+# events buffered per stream before the oldest are dropped.
+EVENTS_MAX_SUBSCRIBERS = int(os.getenv("EVENTS_MAX_SUBSCRIBERS", "5000"))
+EVENTS_KEEPALIVE = int(os.getenv("EVENTS_KEEPALIVE", "25"))
+EVENTS_POLL_INTERVAL = int(os.getenv("EVENTS_POLL_INTERVAL", "3"))
+EVENTS_BUFFER_SIZE = int(os.getenv("EVENTS_BUFFER_SIZE", "100"))
+
+# Scheduler: seconds between leader-election attempts / leader heartbeats.
+# SCHEDULER_ENABLED=0 keeps a process out of the election entirely;
+# `flask <command>` runs other than `flask run` never join it.
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "1") == "1"
+SCHEDULER_ELECTION_INTERVAL = int(os.getenv("SCHEDULER_ELECTION_INTERVAL", "15"))
+
+# Add a Server-Timing header (DB time, query count, pool wait) to every
+# response, readable in the browser's network panel.
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0") == "1"
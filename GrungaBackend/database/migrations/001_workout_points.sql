@@ -0,0 +1,8 @@
+-- Store each workout's computed points on the row so totals can be
+-- summed in SQL. Existing rows start at 0; fill them with:
+--   flask --app app backfill-workout-points
+--   flask --app app recompute-totals
+USE grunga;
+
+ALTER TABLE workouts
+  ADD COLUMN points INT NOT NULL DEFAULT 0 AFTER reps;
@@ -0,0 +1,5 @@
+-- uc_friend_pair (userId, friendId) only serves lookups from the lower
+-- userId's side; this covers the friendId side of the pair.
+USE grunga;
+
+CREATE INDEX idx_friends_friend ON friends (friendId, userId);
@@ -0,0 +1,13 @@
+-- Indexed user search (services/search_service.py).
+-- ngram FULLTEXT index for substring matches on username/displayName, and
+-- a plain index so displayName prefix matches don't scan the table.
+-- Recommended server setting: innodb_ft_enable_stopword = OFF, otherwise
+-- ngrams that contain an English stopword are not indexed.
+-- Restart the API (or call schema_service.refreshSchema()) afterwards so
+-- the FULLTEXT path is picked up.
+USE grunga;
+
+CREATE INDEX idx_users_display_name ON users (displayName);
+
+ALTER TABLE users
+  ADD FULLTEXT INDEX ft_users_search (username, displayName) WITH PARSER ngram;
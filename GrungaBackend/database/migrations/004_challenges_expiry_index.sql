@@ -0,0 +1,5 @@
+-- Lets the expiry sweep find overdue PENDING challenges, oldest first,
+-- without scanning the table.
+USE grunga;
+
+CREATE INDEX idx_challenges_status_due ON challenges (status, dueAt);
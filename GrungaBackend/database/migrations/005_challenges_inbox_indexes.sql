@@ -0,0 +1,7 @@
+-- One index per side of a challenge for the inbox query; each box is a
+-- range on (user, status) already ordered by createdAt (then challengeId,
+-- the implicit primary key suffix) for keyset paging.
+USE grunga;
+
+CREATE INDEX idx_challenges_to_status ON challenges (toUserId, status, createdAt);
+CREATE INDEX idx_challenges_from_status ON challenges (fromUserId, status, createdAt);
@@ -0,0 +1,11 @@
+-- Per-user write counter behind the ETags on points, badge and challenge
+-- reads (services/http_cache.py). Kept out of users, with no foreign key:
+-- bumping a users row would need an exclusive lock on a row the same
+-- transaction's workouts/pointsLedger inserts already hold a shared FK
+-- lock on, and two such writers for one user deadlock.
+USE grunga;
+
+CREATE TABLE userRevisions (
+  userId INT PRIMARY KEY,
+  revision INT UNSIGNED NOT NULL DEFAULT 0
+) ENGINE=InnoDB;
@@ -0,0 +1,15 @@
+-- Run history for scheduled jobs (services/scheduler_service.py). The new
+-- leader also uses it to catch up on a daily_reset its predecessor missed.
+USE grunga;
+
+CREATE TABLE schedulerRuns (
+  runId BIGINT AUTO_INCREMENT PRIMARY KEY,
+  jobId VARCHAR(60) NOT NULL,
+  host VARCHAR(120) NOT NULL,
+  startedAt DATETIME(3) NOT NULL,
+  finishedAt DATETIME(3) NULL,
+  durationMs INT NULL,
+  status ENUM('running','ok','failed') NOT NULL DEFAULT 'running',
+  detail VARCHAR(500) NULL,
+  INDEX idx_scheduler_runs_job (jobId, status, startedAt)
+) ENGINE=InnoDB;
@@ -6,7 +6,9 @@ CREATE TABLE users (
   username VARCHAR(40) NOT NULL UNIQUE,
   displayName VARCHAR(60) NOT NULL DEFAULT 'User',
   email VARCHAR(120) UNIQUE,
-  createdAt TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+  createdAt TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  INDEX idx_users_display_name (displayName),
+  FULLTEXT INDEX ft_users_search (username, displayName) WITH PARSER ngram
 ) ENGINE=InnoDB;
 
 DROP TABLE IF EXISTS challenges;
@@ -23,7 +25,10 @@ CREATE TABLE challenges (
   createdAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
   dueAt DATETIME NOT NULL,
   FOREIGN KEY (fromUserId) REFERENCES users(userId) ON DELETE CASCADE,
-  FOREIGN KEY (toUserId) REFERENCES users(userId) ON DELETE CASCADE
+  FOREIGN KEY (toUserId) REFERENCES users(userId) ON DELETE CASCADE,
+  INDEX idx_challenges_status_due (status, dueAt),
+  INDEX idx_challenges_to_status (toUserId, status, createdAt),
+  INDEX idx_challenges_from_status (fromUserId, status, createdAt)
 );
 
 CREATE TABLE workouts (
@@ -33,6 +38,7 @@ CREATE TABLE workouts (
   workoutType VARCHAR(40) NOT NULL,
   sets INT NOT NULL,
   reps INT NOT NULL,
+  points INT NOT NULL DEFAULT 0,
   createdAt TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
   CONSTRAINT fk_workouts_user FOREIGN KEY (userId) REFERENCES users(userId) ON DELETE CASCADE,
   CONSTRAINT chk_workouts_positive CHECK (sets > 0 AND reps > 0),
@@ -62,6 +68,7 @@ CREATE TABLE IF NOT EXISTS friends (
   CONSTRAINT fk_friends_friend FOREIGN KEY (friendId) REFERENCES users(userId) ON DELETE CASCADE,
   CONSTRAINT fk_friends_initiatedBy FOREIGN KEY (initiatedBy) REFERENCES users(userId) ON DELETE CASCADE,
   CONSTRAINT uc_friend_pair UNIQUE (userId, friendId),
+  INDEX idx_friends_friend (friendId, userId),
   CONSTRAINT chk_not_self CHECK (userId <> friendId)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE utf8mb4_unicode_ci;
 
@@ -90,3 +97,32 @@ CREATE TABLE pointsTotals (
   updatedAt TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
   CONSTRAINT fk_totals_user FOREIGN KEY (userId) REFERENCES users(userId) ON DELETE CASCADE
 ) ENGINE=InnoDB;
+
+CREATE TABLE dailypoints (
+  id INT AUTO_INCREMENT PRIMARY KEY,
+  userId INT NOT NULL,
+  day DATE NOT NULL,
+  points INT NOT NULL DEFAULT 0,
+  CONSTRAINT fk_dailypoints_user FOREIGN KEY (userId) REFERENCES users(userId) ON DELETE CASCADE,
+  UNIQUE KEY uq_user_day (userId, day)
+) ENGINE=InnoDB;
+
+-- Bumped on points/badge/challenge writes (ETags). No FK on purpose: see
+-- migrations/006_user_revisions.sql
+CREATE TABLE userRevisions (
+  userId INT PRIMARY KEY,
+  revision INT UNSIGNED NOT NULL DEFAULT 0
+) ENGINE=InnoDB;
+
+-- One row per scheduled job run, written by the elected scheduler leader
+CREATE TABLE schedulerRuns (
+  runId BIGINT AUTO_INCREMENT PRIMARY KEY,
+  jobId VARCHAR(60) NOT NULL,
+  host VARCHAR(120) NOT NULL,
+  startedAt DATETIME(3) NOT NULL,
+  finishedAt DATETIME(3) NULL,
+  durationMs INT NULL,
+  status ENUM('running','ok','failed') NOT NULL DEFAULT 'running',
+  detail VARCHAR(500) NULL,
+  INDEX idx_scheduler_runs_job (jobId, status, startedAt)
+) ENGINE=InnoDB;
@@ -0,0 +1,54 @@
+import hmac
+from flask import Blueprint, Response, jsonify, request
+from config import ADMIN_TOKEN
+from services.export_service import EXPORT_FORMATS, exportStream, tryStartExport, finishExport
+from services.worker_service import workerStats
+from services.scheduler_service import schedulerStatus, recentRuns
+
+bpAdmin = Blueprint("bpAdmin", __name__)
+
+
+@bpAdmin.before_request
+def requireAdminToken():
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "admin endpoints are disabled"}), 403
+    token = request.headers.get("X-Admin-Token", "")
+    if not hmac.compare_digest(token, ADMIN_TOKEN):
+        return jsonify({"error": "forbidden"}), 403
+
+
+# ===================================================================
+#  BULK EXPORT  (every user, streamed, ?format=ndjson|csv)
+# ===================================================================
+@bpAdmin.get("/export")
+def exportAll():
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": "format must be one of: " + ", ".join(EXPORT_FORMATS)}), 400
+
+    if not tryStartExport():
+        return jsonify({"error": "too many exports running, retry later"}), 503
+
+    resp = Response(
+        exportStream(fmt),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename=grunga-export.{fmt}"},
+    )
+    resp.call_on_close(finishExport)
+    return resp
+
+
+# ===================================================================
+#  BACKGROUND WORKER STATS  (queue depth + counters, this process)
+# ===================================================================
+@bpAdmin.get("/worker")
+def workerStatus():
+    return jsonify(workerStats())
+
+
+# ===================================================================
+#  SCHEDULER  (this process's leader status + recent run history)
+# ===================================================================
+@bpAdmin.get("/scheduler")
+def schedulerInfo():
+    return jsonify({**schedulerStatus(), "runs": recentRuns()})
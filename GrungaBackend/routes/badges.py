@@ -1,18 +1,30 @@
 from flask import Blueprint, jsonify
 from services.connection import db_cursor as dbCursor
+from services.badges_service import badgeCatalog, badgeCatalogVersion
+from services.http_cache import conditionalResponse, makeEtag, userRevision
 
 bpBadges = Blueprint("badges", __name__, url_prefix="/api/badges")
 
+# The catalog only changes with a deploy/migration
+CATALOG_CACHE_CONTROL = "public, max-age=3600"
+
 @bpBadges.get("/")
 def listBadges():
-    with dbCursor() as db:
-        db.execute("SELECT badgeId, code, name, description FROM badges")
-        rows = db.fetchAll() or []
-    return jsonify(rows)
+    # Served from the in-process catalog cache, no query per request
+    return conditionalResponse(
+        badgeCatalogVersion(),
+        lambda: jsonify(sorted(badgeCatalog().values(), key=lambda r: r["badgeId"])),
+        CATALOG_CACHE_CONTROL,
+    )
 
 # NEW ROUTE: Get unlocked badges for a user
 @bpBadges.get("/user/<int:userId>")
 def listUserBadges(userId):
+    etag = makeEtag("badges", userId, userRevision(userId), badgeCatalogVersion())
+    return conditionalResponse(etag, lambda: _userBadgesResponse(userId))
+
+
+def _userBadgesResponse(userId):
     with dbCursor() as db:
         db.execute("""
             SELECT b.badgeId, b.code, b.name, b.description, ub.unlockedAt
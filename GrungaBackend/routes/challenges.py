@@ -1,30 +1,27 @@
+from datetime import datetime
 from flask import Blueprint, request, jsonify
 from services.challenges_service import (
     create_challenge,
     get_challenges_for_user,
+    get_challenge_inbox,
     accept_challenge,
     decline_challenge,
     complete_challenge,
 )
-from services.friendsService import getUserByUsername
+from services.identity_service import getCurrentUserId
+from services.pagination import pageArgs, encodeCursor, decodeCursor, NEXT_CURSOR_HEADER
+from services.http_cache import conditionalResponse, makeEtag, userRevision
+from services.points_service import nowCt
 
 
 challengesBlueprint = Blueprint("challenges", __name__, url_prefix="/api/challenges")
 
 
-# -------------------------------------------------------------------
-# Helper to get current user ID from header X-Demo-User
-# -------------------------------------------------------------------
-def getCurrentUserId():
-    username = request.headers.get("X-Demo-User", None)
-    if not username:
-        return None
-
-    user = getUserByUsername(username)
-    if not user:
-        return None
-
-    return user["userId"]
+def _conditionalList(userId, box, build):
+    # Challenge writes and the expiry sweep bump the users' revision; the date
+    # covers overdue rows dropping out of the incoming box before the sweep.
+    etag = makeEtag("challenges", box, userId, userRevision(userId), nowCt().date())
+    return conditionalResponse(etag, build)
 
 
 # -------------------------------------------------------------------
@@ -69,8 +66,7 @@ def list_incoming_route():
     if not userId:
         return jsonify({"error": "User not found"}), 401
 
-    rows = get_challenges_for_user(userId, "incoming")
-    return jsonify(rows), 200
+    return _conditionalList(userId, "incoming", lambda: jsonify(get_challenges_for_user(userId, "incoming")))
 
 
 @challengesBlueprint.get("/active")
@@ -79,8 +75,7 @@ def list_active_route():
     if not userId:
         return jsonify({"error": "User not found"}), 401
 
-    rows = get_challenges_for_user(userId, "active")
-    return jsonify(rows), 200
+    return _conditionalList(userId, "active", lambda: jsonify(get_challenges_for_user(userId, "active")))
 
 
 @challengesBlueprint.get("/completed")
@@ -89,8 +84,40 @@ def list_completed_route():
     if not userId:
         return jsonify({"error": "User not found"}), 401
 
-    rows = get_challenges_for_user(userId, "done")
-    return jsonify(rows), 200
+    return _conditionalList(userId, "done", lambda: jsonify(get_challenges_for_user(userId, "done")))
+
+
+# -------------------------------------------------------------------
+# INBOX (incoming + active + done page + counts)
+# GET /api/challenges/inbox?limit=N&cursor=...
+# cursor pages the done box; the next one is in "nextCursor" / X-Next-Cursor
+# -------------------------------------------------------------------
+
+@challengesBlueprint.get("/inbox")
+def inbox_route():
+    userId = getCurrentUserId()
+    if not userId:
+        return jsonify({"error": "User not found"}), 401
+
+    try:
+        limit, cursor = pageArgs(request.args)
+        after = decodeCursor(cursor, 2) if cursor else None
+        if after:
+            after = (datetime.fromisoformat(after[0]), int(after[1]))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def build():
+        inbox = get_challenge_inbox(userId, limit, after)
+        doneNext = inbox.pop("doneNext")
+        inbox["nextCursor"] = encodeCursor(doneNext[0].isoformat(), doneNext[1]) if doneNext else None
+
+        resp = jsonify(inbox)
+        if inbox["nextCursor"]:
+            resp.headers[NEXT_CURSOR_HEADER] = inbox["nextCursor"]
+        return resp
+
+    return _conditionalList(userId, f"inbox:{limit}:{cursor}", build)
 
 
 # -------------------------------------------------------------------
@@ -0,0 +1,31 @@
+from flask import Blueprint, Response, jsonify, request
+from services.events_service import subscribe, eventStream
+from services.http_cache import userRevision
+from services.identity_service import resolveUserId
+
+bpEvents = Blueprint("bpEvents", __name__)
+
+
+# ===================================================================
+#  SERVER-SENT EVENTS  (totals, badge unlocks, challenges, friends)
+#  EventSource can't send headers, so the user may come as ?user=<name>
+# ===================================================================
+@bpEvents.get("/stream")
+def eventsStream():
+    username = request.headers.get("X-Demo-User") or request.args.get("user")
+    userId = resolveUserId(username) if username else None
+    if not userId:
+        return jsonify({"error": "User not found"}), 401
+
+    hello = {"userId": userId, "revision": userRevision(userId)}
+    sub = subscribe(userId)
+    if sub is None:
+        return jsonify({"error": "too many event subscribers, retry later"}), 503
+
+    # No stream_with_context: the body runs after the request (and its DB
+    # connection) is torn down and only waits on the subscription.
+    return Response(
+        eventStream(sub, hello),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
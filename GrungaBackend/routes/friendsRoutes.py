@@ -1,6 +1,5 @@
 from flask import Blueprint, request, jsonify
 from services.friendsService import (
-    getUserByUsername,
     searchUsers,
     sendFriendRequest,
     respondToFriendRequest,
@@ -9,21 +8,27 @@ from services.friendsService import (
     removeFriend,
     getFriendStatus,
 )
-from services.points_service import recomputeTotalsForUser, weeklyHistogramForUser
+from services.points_service import (
+    totalsSnapshotForUser,
+    weeklyHistogramForUser,
+    totalsSnapshotsForUsers,
+    weeklyHistogramsForUsers,
+)
+from services.leaderboard_service import getFriendsLeaderboard, LEADERBOARD_PERIODS
 from services.connection import db_cursor
+from services.identity_service import getCurrentUserId
 
 friendsBlueprint = Blueprint("friends", __name__)
 
-def getCurrentUserId():
-    username = request.headers.get("X-Demo-User", "demo1")
-    user = getUserByUsername(username)
-    if not user:
-        return None
-    return user["userId"]
+# Max ids accepted by POST /api/friends/profiles
+MAX_PROFILE_BATCH = 100
+
+# Friends pages fall back to the demo account when no X-Demo-User is sent
+DEFAULT_USER = "demo1"
 
 @friendsBlueprint.route("/users/search")
 def searchUsersRoute():
-    userId = getCurrentUserId()
+    userId = getCurrentUserId(DEFAULT_USER)
     if not userId:
         return jsonify({"error": "User not found"}), 401
 
@@ -31,12 +36,18 @@ def searchUsersRoute():
     if not query:
         return jsonify([])
 
-    users = searchUsers(query, userId)
+    try:
+        limit = int(request.args.get("limit", 20))
+        offset = int(request.args.get("offset", 0))
+    except ValueError:
+        return jsonify({"error": "limit and offset must be integers"}), 400
+
+    users = searchUsers(query, userId, limit=limit, offset=offset)
     return jsonify(users)
 
 @friendsBlueprint.route("/", methods=["GET"])
 def listFriendsRoute():
-    userId = getCurrentUserId()
+    userId = getCurrentUserId(DEFAULT_USER)
     if not userId:
         return jsonify({"error": "User not found"}), 401
 
@@ -49,9 +60,25 @@ def listFriendsRoute():
         "outgoing": pending["outgoing"]
     })
 
+@friendsBlueprint.route("/leaderboard", methods=["GET"])
+def leaderboardRoute():
+    """
+    GET /api/friends/leaderboard?period=daily|weekly|total
+    The current user plus accepted friends, ranked by points.
+    """
+    userId = getCurrentUserId(DEFAULT_USER)
+    if not userId:
+        return jsonify({"error": "User not found"}), 401
+
+    period = (request.args.get("period") or "weekly").strip().lower()
+    if period not in LEADERBOARD_PERIODS:
+        return jsonify({"error": "period must be daily, weekly or total"}), 400
+
+    return jsonify(getFriendsLeaderboard(userId, period))
+
 @friendsBlueprint.route("/requests", methods=["POST"])
 def sendFriendRequestRoute():
-    userId = getCurrentUserId()
+    userId = getCurrentUserId(DEFAULT_USER)
     if not userId:
         return jsonify({"error": "User not found"}), 401
 
@@ -67,7 +94,7 @@ def sendFriendRequestRoute():
 
 @friendsBlueprint.route("/requests/respond", methods=["POST"])
 def respondFriendRequestRoute():
-    userId = getCurrentUserId()
+    userId = getCurrentUserId(DEFAULT_USER)
     if not userId:
         return jsonify({"error": "User not found"}), 401
 
@@ -85,7 +112,7 @@ def respondFriendRequestRoute():
 
 @friendsBlueprint.route("/remove/<int:otherUserId>", methods=["DELETE"])
 def removeFriendRoute(otherUserId):
-    userId = getCurrentUserId()
+    userId = getCurrentUserId(DEFAULT_USER)
     if not userId:
         return jsonify({"error": "User not found"}), 401
 
@@ -101,7 +128,7 @@ def friendProfileRoute(friendId):
     for the given friendId, as long as the current user is that
     user or they are friends.
     """
-    currentUserId = getCurrentUserId()
+    currentUserId = getCurrentUserId(DEFAULT_USER)
     if not currentUserId:
         return jsonify({"error": "User not found"}), 401
 
@@ -110,8 +137,8 @@ def friendProfileRoute(friendId):
     if currentUserId != friendId and status != "friends":
         return jsonify({"error": "You can only view stats for friends."}), 403
 
-    # Recompute totals for this friend (workouts + challenges, etc.)
-    totals = recomputeTotalsForUser(friendId)
+    # Totals snapshot for this friend (workouts + challenges, etc.)
+    totals = totalsSnapshotForUser(friendId)
 
     # Count total workouts for this friend
     with db_cursor() as db:
@@ -133,3 +160,68 @@ def friendProfileRoute(friendId):
         "totalWorkouts": total_workouts,
         "weeklyHistogram": histogram,
     })
+
+
+@friendsBlueprint.route("/profiles", methods=["POST"])
+def friendProfilesRoute():
+    """
+    POST /api/friends/profiles
+    Body: { "friendIds": [1, 2, ...] }
+    Same stats as /profile/<friendId>, for many users at once. Ids that
+    are not the current user or one of their friends are returned in
+    "forbidden" instead of "profiles".
+    """
+    currentUserId = getCurrentUserId(DEFAULT_USER)
+    if not currentUserId:
+        return jsonify({"error": "User not found"}), 401
+
+    data = request.get_json(silent=True) or {}
+    rawIds = (data.get("friendIds") or []) if isinstance(data, dict) else None
+    if not isinstance(rawIds, list) or any(isinstance(i, bool) for i in rawIds):
+        return jsonify({"error": "friendIds must be a list of user ids."}), 400
+    try:
+        friendIds = list(dict.fromkeys(int(i) for i in rawIds))
+    except (TypeError, ValueError):
+        return jsonify({"error": "friendIds must be a list of user ids."}), 400
+
+    if len(friendIds) > MAX_PROFILE_BATCH:
+        return jsonify({"error": f"At most {MAX_PROFILE_BATCH} friendIds per request."}), 400
+
+    allowed = []
+    forbidden = []
+    for fid in friendIds:
+        status = getFriendStatus(currentUserId, fid)
+        (allowed if status in ("self", "friends") else forbidden).append(fid)
+
+    totals = totalsSnapshotsForUsers(allowed)
+    histograms = weeklyHistogramsForUsers(allowed)
+
+    counts = {}
+    if allowed:
+        placeholders = ", ".join(["%s"] * len(allowed))
+        with db_cursor() as db:
+            db.execute(f"""
+                SELECT userId, COUNT(*) AS cnt
+                FROM workouts
+                WHERE userId IN ({placeholders})
+                GROUP BY userId
+            """, tuple(allowed))
+            counts = {r["userId"]: int(r["cnt"]) for r in db.fetchAll() or []}
+
+    profiles = []
+    for fid in allowed:
+        t = totals[fid]
+        profiles.append({
+            "userId": fid,
+            "points": {
+                "total": t["total"],
+                "weekly": t["weekly"],
+                "daily": t["daily"],
+                "streak": t["streak"],
+            },
+            "boss": t["boss"],
+            "totalWorkouts": counts.get(fid, 0),
+            "weeklyHistogram": histograms[fid],
+        })
+
+    return jsonify({"profiles": profiles, "forbidden": forbidden})
@@ -1,11 +1,11 @@
 from flask import Blueprint, jsonify
-from services.points_service import recomputeTotalsForUser
+from services.points_service import totalsSnapshotForUser
 
 bpStreaks = Blueprint("streaks", __name__, url_prefix="/api/streaks")
 
 @bpStreaks.get("/<int:userId>")
 def getStreak(userId):
-    totals = recomputeTotalsForUser(userId)
+    totals = totalsSnapshotForUser(userId)
     return jsonify({
         "streak": totals["streak"],
         "daily": totals["daily"],
@@ -1,6 +1,10 @@
 from flask import Blueprint, jsonify, request
-from services.connection import fetchAll, fetchOne, execute
+from services.connection import fetchAll, fetchOne, execute, afterCommit
 from mysql.connector.errors import ProgrammingError
+from services.schema_service import hasColumn
+from services.search_service import searchUsers
+from services.identity_service import invalidateIdentity
+from services.pagination import pageArgs, encodeCursor, decodeCursor, NEXT_CURSOR_HEADER
 
 bpUsers = Blueprint("users", __name__)
 
@@ -15,19 +19,9 @@ def _table_has_column(table: str, column: str) -> bool:
     """
     Return True if `table`.`column` exists in the current DB.
     This lets us run on older dev schemas without crashing.
+    Served from the schema registry loaded at startup.
     """
-    row = fetchOne(
-        """
-        SELECT 1
-        FROM information_schema.COLUMNS
-        WHERE TABLE_SCHEMA = DATABASE()
-          AND TABLE_NAME = %s
-          AND COLUMN_NAME = %s
-        LIMIT 1
-        """,
-        (table, column),
-    )
-    return bool(row)
+    return hasColumn(table, column)
 
 
 def _users_select_fields():
@@ -108,20 +102,36 @@ def health():
 def listOrSearchUsers():
     """
     GET /api/users
-    Optional: ?q=substr  -> case-insensitive search on username/displayName
+    Without q: all users, keyset paged with ?limit=&cursor=
+    Optional: ?q=substr  -> case-insensitive search on username/displayName,
+              ranked exact > prefix > substring, paged with ?limit=&offset=
     """
     fields = _users_select_fields()
     q = (request.args.get("q") or "").strip()
     if q:
-        like = f"%{q}%"
-        rows = fetchAll(
-            f"SELECT {fields} FROM users WHERE username LIKE %s OR displayName LIKE %s ORDER BY userId",
-            (like, like),
-        )
+        try:
+            limit = int(request.args.get("limit", 20))
+            offset = int(request.args.get("offset", 0))
+        except ValueError:
+            return _err("limit and offset must be integers")
+        rows = searchUsers(q, limit=limit, offset=offset, fields=fields)
         return jsonify(rows)
 
-    rows = fetchAll(f"SELECT {fields} FROM users ORDER BY userId")
-    return jsonify(rows)
+    # Keyset paged by userId: ?limit=N&cursor=... (next cursor in X-Next-Cursor)
+    try:
+        limit, cursor = pageArgs(request.args)
+        afterId = int(decodeCursor(cursor, 1)[0]) if cursor else 0
+    except ValueError as e:
+        return _err(str(e))
+
+    rows = fetchAll(
+        f"SELECT {fields} FROM users WHERE userId > %s ORDER BY userId LIMIT %s",
+        (afterId, limit + 1),
+    )
+    resp = jsonify(rows[:limit])
+    if len(rows) > limit:
+        resp.headers[NEXT_CURSOR_HEADER] = encodeCursor(rows[limit - 1]["userId"])
+    return resp
 
 
 @bpUsers.get("/users/<string:username>")
@@ -174,6 +184,7 @@ def createUser():
             (username, displayName),
         )
     newId = res["lastRowId"]
+    afterCommit(lambda: invalidateIdentity(username))
 
     # ensure a totals row if table exists
     try:
@@ -308,9 +319,3 @@ def getUserWorkouts(userId: int):
         (userId,)
     )
     return jsonify({"total": row["total"] if row else 0})
-
-@bpUsers.get("/test-streak")
-def test_streak():
-    from services.scheduler_service import resetDailyTasks
-    resetDailyTasks()
-    return {"ok": True, "msg": "Streak test run complete"}
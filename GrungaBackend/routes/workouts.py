@@ -1,6 +1,18 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
+from config import BULK_WORKOUT_MAX
 from services.connection import db_cursor as dbCursor
-from services.points_service import recomputeTotalsForUser, weeklyHistogramForUser
+from services.export_service import EXPORT_FORMATS, exportStream, tryStartExport, finishExport
+from services.http_cache import conditionalResponse, makeEtag, userRevision
+from services.pagination import pageArgs, encodeCursor, decodeCursor, NEXT_CURSOR_HEADER
+from services.points_service import (
+    totalsSnapshotForUser,
+    weeklyHistogramForUser,
+    applyPointsDelta,
+    queueTotalsBadges,
+    pointsForRow,
+    scoreWorkouts,
+    nowCt,
+)
 
 bpWorkouts = Blueprint("bpWorkouts", __name__)
 
@@ -19,31 +31,64 @@ def getUserByUsername(username):
 
 
 # ===================================================================
-#  List workouts for a user
+#  List workouts for a user (keyset paged, newest first)
+#  ?limit=N&cursor=...  next page cursor comes back in X-Next-Cursor
 # ===================================================================
 @bpWorkouts.get("/users/<int:userId>/workouts")
 def listWorkouts(userId):
+    from datetime import date
+
+    try:
+        limit, cursor = pageArgs(request.args)
+        after = decodeCursor(cursor, 2) if cursor else None
+        if after:
+            after = (date.fromisoformat(after[0]), int(after[1]))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # (workoutDate, workoutId) follows idx_workouts_user_date, which
+    # carries the primary key, so every page is an index range read.
     with dbCursor() as db:
-        db.execute("""
-            SELECT workoutId, workoutType, sets, reps, workoutDate
-            FROM workouts
-            WHERE userId=%s
-            ORDER BY workoutDate DESC, workoutId DESC
-        """, (userId,))
+        if after:
+            db.execute("""
+                SELECT workoutId, workoutType, sets, reps, workoutDate
+                FROM workouts
+                WHERE userId=%s
+                  AND (workoutDate < %s OR (workoutDate = %s AND workoutId < %s))
+                ORDER BY workoutDate DESC, workoutId DESC
+                LIMIT %s
+            """, (userId, after[0], after[0], after[1], limit + 1))
+        else:
+            db.execute("""
+                SELECT workoutId, workoutType, sets, reps, workoutDate
+                FROM workouts
+                WHERE userId=%s
+                ORDER BY workoutDate DESC, workoutId DESC
+                LIMIT %s
+            """, (userId, limit + 1))
         rows = db.fetchAll() or []
-    return jsonify(rows)
+
+    resp = jsonify(rows[:limit])
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        resp.headers[NEXT_CURSOR_HEADER] = encodeCursor(last["workoutDate"].isoformat(), last["workoutId"])
+    return resp
 
 
 # ===================================================================
 #  CREATE WORKOUT  (INCLUDES INSTANT STREAK LOGIC)
 # ===================================================================
-@bpWorkouts.post("/users/<int:userId>/workouts")
-def createWorkout(userId):
+def _parseWorkoutPayload(data):
+    """
+    Validates one workout body and returns (workoutType, sets, reps,
+    workoutDate), with the timestamp converted to a Chicago date.
+    Raises ValueError on bad input.
+    """
     import pytz
     from datetime import datetime
-    from services.badges_service import unlockBadge
 
-    data = request.get_json(force=True) or {}
+    if not isinstance(data, dict):
+        raise ValueError("invalid input")
 
     workoutType = data.get("workoutType")
     sets = int(data.get("sets", 0))
@@ -51,46 +96,131 @@ def createWorkout(userId):
     workoutDateStr = data.get("workoutDate")
 
     if not workoutType or sets <= 0 or reps <= 0 or not workoutDateStr:
-        return jsonify({"error": "invalid input"}), 400
+        raise ValueError("invalid input")
 
     # Convert timestamp to Chicago date
     tz = pytz.timezone("America/Chicago")
-    dt = datetime.fromisoformat(workoutDateStr.replace("Z", ""))
+    dt = datetime.fromisoformat(str(workoutDateStr).replace("Z", ""))
     dt = tz.localize(dt)
-    workoutDate = dt.date()
+    return workoutType, sets, reps, dt.date()
+
 
-    # Insert workout
+@bpWorkouts.post("/users/<int:userId>/workouts")
+def createWorkout(userId):
+    data = request.get_json(force=True) or {}
+
+    try:
+        workoutType, sets, reps, workoutDate = _parseWorkoutPayload(data)
+    except (TypeError, ValueError):
+        return jsonify({"error": "invalid input"}), 400
+
+    earnedPoints = pointsForRow(sets, reps, workoutType)
+
+    # Insert workout + apply its points to the totals in one transaction
     with dbCursor(commit=True) as db:
         db.execute("""
-            INSERT INTO workouts (userId, workoutType, sets, reps, workoutDate)
-            VALUES (%s,%s,%s,%s,%s)
-        """, (userId, workoutType, sets, reps, workoutDate))
+            INSERT INTO workouts (userId, workoutType, sets, reps, workoutDate, points)
+            VALUES (%s,%s,%s,%s,%s,%s)
+        """, (userId, workoutType, sets, reps, workoutDate, earnedPoints))
         wid = db.lastRowId()
 
-    # Recompute totals
-    totals = recomputeTotalsForUser(userId)
-    newDaily = totals["daily"]
-    earnedPoints = sets * reps
-    prevDaily = newDaily - earnedPoints
+        totals = applyPointsDelta(db, userId, [(workoutDate, earnedPoints)])
+        newDaily = totals["daily"]
+        prevDaily = newDaily - earnedPoints if workoutDate == nowCt().date() else newDaily
 
-    # ============ FIRST WORKOUT BADGE ============
-    with dbCursor() as db:
-        db.execute("SELECT COUNT(*) AS c FROM workouts WHERE userId=%s", (userId,))
-        row = db.fetchOne()
-        if row and row["c"] == 1:
-            unlockBadge(userId, "FIRST_WORKOUT")
+        # ============ STREAK LOGIC ============
+        if prevDaily < 100 and newDaily >= 100:
+            db.execute("""
+                UPDATE pointsTotals
+                SET streak = streak + 1
+                WHERE userId=%s
+            """, (userId,))
+            totals["streak"] += 1
+
+    # Boss / streak / first-workout badges, checked in the background
+    queueTotalsBadges(userId, totals, hasWorkout=True)
+
+    return jsonify({"ok": True, "workoutId": wid, "totals": totals}), 201
 
 
-    # ============ STREAK LOGIC ============
-    if prevDaily < 100 and newDaily >= 100:
-        with dbCursor(commit=True) as db:
+# ===================================================================
+#  BULK CREATE WORKOUTS  (device sync)
+#  Body: [workout, ...] or {"workouts": [...]}; invalid items are
+#  reported per index and skipped, the rest go in one transaction.
+# ===================================================================
+@bpWorkouts.post("/users/<int:userId>/workouts/bulk")
+def createWorkoutsBulk(userId):
+    data = request.get_json(force=True) or {}
+    items = data.get("workouts") if isinstance(data, dict) else data
+
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "expected a non-empty list of workouts"}), 400
+    if len(items) > BULK_WORKOUT_MAX:
+        return jsonify({"error": f"at most {BULK_WORKOUT_MAX} workouts per call"}), 413
+
+    results = []
+    valid = []          # (index, (workoutType, sets, reps, workoutDate))
+    for i, item in enumerate(items):
+        try:
+            valid.append((i, _parseWorkoutPayload(item)))
+        except (TypeError, ValueError):
+            results.append({"index": i, "ok": False, "error": "invalid input"})
+
+    if not valid:
+        return jsonify({"ok": False, "created": 0, "results": results}), 400
+
+    points = scoreWorkouts([(sets, reps, wtype) for _, (wtype, sets, reps, _d) in valid])
+    rows = [
+        (userId, wtype, sets, reps, workoutDate, pts)
+        for (_, (wtype, sets, reps, workoutDate)), pts in zip(valid, points)
+    ]
+    today = nowCt().date()
+    earnedToday = sum(r[5] for r in rows if r[4] == today)
+
+    with dbCursor(commit=True) as db:
+        db.executemany("""
+            INSERT INTO workouts (userId, workoutType, sets, reps, workoutDate, points)
+            VALUES (%s,%s,%s,%s,%s,%s)
+        """, rows)
+        # executemany sends a single multi-row INSERT whose ids start at
+        # lastRowId and rise in row order. The step depends on
+        # auto_increment_increment, so read them back instead of adding n.
+        # Another statement's ids are all below or above this block.
+        db.execute("""
+            SELECT workoutId
+            FROM workouts
+            WHERE userId=%s AND workoutId >= %s
+            ORDER BY workoutId
+            LIMIT %s
+        """, (userId, db.lastRowId(), len(rows)))
+        workoutIds = [r["workoutId"] for r in db.fetchAll() or []]
+
+        totals = applyPointsDelta(db, userId, [(r[4], r[5]) for r in rows])
+        newDaily = totals["daily"]
+        prevDaily = newDaily - earnedToday
+
+        # ============ STREAK LOGIC (once for the batch) ============
+        if prevDaily < 100 and newDaily >= 100:
             db.execute("""
                 UPDATE pointsTotals
                 SET streak = streak + 1
                 WHERE userId=%s
             """, (userId,))
+            totals["streak"] += 1
 
-    return jsonify({"ok": True, "workoutId": wid, "totals": totals}), 201
+    queueTotalsBadges(userId, totals, hasWorkout=True)
+
+    for (i, _), row, workoutId in zip(valid, rows, workoutIds):
+        results.append({"index": i, "ok": True, "workoutId": workoutId, "points": row[5]})
+    results.sort(key=lambda r: r["index"])
+
+    return jsonify({
+        "ok": True,
+        "created": len(rows),
+        "failed": len(items) - len(rows),
+        "results": results,
+        "totals": totals,
+    }), 201
 
 
 # ===================================================================
@@ -140,22 +270,44 @@ def updateWorkout(userId, workoutId):
     if not fields:
         return jsonify({"error": "no changes"}), 400
 
-    vals.extend([userId, workoutId])
-
-    # Update workout
     with dbCursor(commit=True) as db:
+        db.execute("""
+            SELECT workoutType, sets, reps, workoutDate, points
+            FROM workouts
+            WHERE userId=%s AND workoutId=%s
+            FOR UPDATE
+        """, (userId, workoutId))
+        old = db.fetchOne()
+        if not old:
+            return jsonify({"error": "workout not found"}), 404
+
+        # Re-score the edited row so workouts.points stays in sync
+        newPoints = pointsForRow(
+            sets if sets is not None else old["sets"],
+            reps if reps is not None else old["reps"],
+            workoutType if workoutType is not None else old["workoutType"],
+        )
+        newDate = workoutDate if workoutDate is not None else old["workoutDate"]
+        fields.append("points=%s")
+        vals.append(newPoints)
+        vals.extend([userId, workoutId])
+
+        # Update workout
         db.execute(
             f"UPDATE workouts SET {', '.join(fields)} WHERE userId=%s AND workoutId=%s",
             vals
         )
 
-    # Recompute totals
-    totals = recomputeTotalsForUser(userId)
-    newDaily = totals["daily"]
+        # Swap the old row's points out and the edited row's points in.
+        # NOTE: DO NOT give streaks from editing!
+        # Editing does NOT qualify for streak earning.
+        # (User must EARN points, not edit them.)
+        totals = applyPointsDelta(db, userId, [
+            (old["workoutDate"], -int(old["points"])),
+            (newDate, newPoints),
+        ])
 
-    # NOTE: DO NOT give streaks from editing!
-    # Editing does NOT qualify for streak earning.
-    # (User must EARN points, not edit them.)
+    queueTotalsBadges(userId, totals)
 
     return jsonify({"ok": True, "totals": totals})
 
@@ -172,12 +324,23 @@ def deleteWorkout(userId):
         return jsonify({"error": "Missing workoutId"}), 400
 
     with dbCursor(commit=True) as db:
+        db.execute("""
+            SELECT workoutDate, points
+            FROM workouts
+            WHERE userId=%s AND workoutId=%s
+            FOR UPDATE
+        """, (userId, workoutId))
+        old = db.fetchOne()
+        if not old:
+            return jsonify({"error": "workout not found"}), 404
+
         db.execute(
             "DELETE FROM workouts WHERE userId=%s AND workoutId=%s",
             (userId, workoutId)
         )
 
-    totals = recomputeTotalsForUser(userId)
+        totals = applyPointsDelta(db, userId, [(old["workoutDate"], -int(old["points"]))])
+
     return jsonify({"ok": True, "totals": totals})
 
 
@@ -186,7 +349,13 @@ def deleteWorkout(userId):
 # ===================================================================
 @bpWorkouts.get("/users/<int:userId>/points")
 def getPoints(userId):
-    totals = recomputeTotalsForUser(userId)
+    # Daily/weekly/boss also roll over with the date, not just on writes
+    etag = makeEtag("points", userId, userRevision(userId), nowCt().date())
+    return conditionalResponse(etag, lambda: _pointsResponse(userId))
+
+
+def _pointsResponse(userId):
+    totals = totalsSnapshotForUser(userId)
     hist = weeklyHistogramForUser(userId)
     boss = totals.get("boss", {})
 
@@ -198,3 +367,31 @@ def getPoints(userId):
         "hist": hist,
         "boss": boss
     })
+
+
+# ===================================================================
+#  EXPORT WORKOUT HISTORY  (streamed, ?format=ndjson|csv)
+# ===================================================================
+@bpWorkouts.get("/users/<int:userId>/export")
+def exportWorkouts(userId):
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": "format must be one of: " + ", ".join(EXPORT_FORMATS)}), 400
+
+    with dbCursor() as db:
+        db.execute("SELECT userId FROM users WHERE userId=%s", (userId,))
+        if not db.fetchOne():
+            return jsonify({"error": "user not found"}), 404
+
+    # The slot is freed when the response is closed, whether or not the
+    # body was ever read
+    if not tryStartExport():
+        return jsonify({"error": "too many exports running, retry later"}), 503
+
+    resp = Response(
+        exportStream(fmt, userId),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename=grunga-user-{userId}.{fmt}"},
+    )
+    resp.call_on_close(finishExport)
+    return resp
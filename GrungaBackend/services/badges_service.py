@@ -1,44 +1,159 @@
-from services.connection import db_cursor as dbCursor
+from collections import OrderedDict
+import threading
+from services.connection import db_cursor as dbCursor, afterCommit
+from services.http_cache import bumpUserRevision, makeEtag
+from services.events_service import publishAfterCommit
+
+# Badge rules evaluated by evaluateBadges(): code -> (fact name, predicate).
+# A rule is only checked when its fact is passed in.
+BADGE_RULES = {
+    "FIRST_WORKOUT": ("hasWorkout", lambda v: bool(v)),
+    "BOSS_SLAYER": ("bossHp", lambda v: v <= 0),
+    "STREAK_7": ("streak", lambda v: v >= 7),
+}
+
+# Per-user cache of unlocked badgeIds, least recently used evicted first.
+USER_BADGE_CACHE_SIZE = 10000
+
+_catalog = None  # code -> badge row
+_catalogVersion = None
+_catalogLock = threading.Lock()
+
+_userBadges = OrderedDict()  # userId -> set(badgeId)
+_userBadgesLock = threading.Lock()
+
+
+# -----------------------------------------------------------
+# Badge catalog (cached in-process; badges rarely change)
+# -----------------------------------------------------------
+def badgeCatalog() -> dict:
+    global _catalog, _catalogVersion
+    if _catalog is None:
+        with _catalogLock:
+            if _catalog is None:
+                with dbCursor() as db:
+                    db.execute("SELECT badgeId, code, name, description FROM badges ORDER BY badgeId")
+                    rows = db.fetchAll() or []
+                _catalogVersion = makeEtag(*(tuple(r.values()) for r in rows))
+                _catalog = {r["code"]: r for r in rows}
+    return _catalog
+
+
+def badgeCatalogVersion() -> str:
+    """Content hash of the cached catalog (changes on refreshBadgeCatalog)."""
+    badgeCatalog()
+    return _catalogVersion
+
+
+def refreshBadgeCatalog():
+    global _catalog
+    with _catalogLock:
+        _catalog = None
+
 
 # -----------------------------------------------------------
 # Get badgeId from code
 # -----------------------------------------------------------
 def getBadgeId(code: str):
+    row = badgeCatalog().get(code)
+    return row["badgeId"] if row else None
+
+
+# -----------------------------------------------------------
+# Unlocked badges per user (cached; unlocks are never revoked)
+# -----------------------------------------------------------
+def _unlockedBadgeIds(userId: int) -> set:
+    with _userBadgesLock:
+        held = _userBadges.get(userId)
+        if held is not None:
+            _userBadges.move_to_end(userId)
+            return held
+
     with dbCursor() as db:
-        db.execute("SELECT badgeId FROM badges WHERE code=%s", (code,))
-        row = db.fetchOne()
-        return row["badgeId"] if row else None
+        db.execute("SELECT badgeId FROM userBadges WHERE userId=%s", (userId,))
+        held = {r["badgeId"] for r in db.fetchAll() or []}
+
+    with _userBadgesLock:
+        held = _userBadges.setdefault(userId, held)
+        _userBadges.move_to_end(userId)
+        while len(_userBadges) > USER_BADGE_CACHE_SIZE:
+            _userBadges.popitem(last=False)
+    return held
+
+
+def _rememberUnlocks(userId: int, badgeIds):
+    with _userBadgesLock:
+        held = _userBadges.get(userId)
+        if held is not None:
+            held.update(badgeIds)
 
 
 # -----------------------------------------------------------
 # Check if user already unlocked badge
 # -----------------------------------------------------------
 def userHasBadge(userId: int, badgeId: int) -> bool:
-    with dbCursor() as db:
-        db.execute("""
-            SELECT 1 FROM userBadges
-            WHERE userId=%s AND badgeId=%s
-        """, (userId, badgeId))
-        return db.fetchOne() is not None
+    return badgeId in _unlockedBadgeIds(userId)
 
 
 # -----------------------------------------------------------
-# Unlock badge — safe, duplicate-proof
+# Unlock badges — one INSERT IGNORE batch, duplicate-proof
 # -----------------------------------------------------------
-def unlockBadge(userId: int, code: str):
-    badgeId = getBadgeId(code)
-    if not badgeId:
-        print(f"[BADGE ERROR] Badge code '{code}' does not exist")
-        return False
+def _unlockBadgeCodes(userId: int, codes) -> list:
+    catalog = badgeCatalog()
+    held = _unlockedBadgeIds(userId)
 
-    if userHasBadge(userId, badgeId):
-        return False  # already unlocked, do nothing
+    newIds = []
+    unlocked = []
+    for code in codes:
+        row = catalog.get(code)
+        if not row:
+            print(f"[BADGE ERROR] Badge code '{code}' does not exist")
+            continue
+        if row["badgeId"] in held or row["badgeId"] in newIds:
+            continue  # already unlocked, do nothing
+        newIds.append(row["badgeId"])
+        unlocked.append(code)
+
+    if not newIds:
+        return []
 
     with dbCursor(commit=True) as db:
-        db.execute("""
-            INSERT INTO userBadges (userId, badgeId)
+        db.executemany("""
+            INSERT IGNORE INTO userBadges (userId, badgeId)
             VALUES (%s, %s)
-        """, (userId, badgeId))
+        """, [(userId, badgeId) for badgeId in newIds])
+        bumpUserRevision(db, userId)
+
+    afterCommit(lambda: _rememberUnlocks(userId, newIds))
+    publishAfterCommit(userId, "badge", {"codes": unlocked})
 
-    print(f"[BADGE] User {userId} unlocked {code}")
-    return True
+    for code in unlocked:
+        print(f"[BADGE] User {userId} unlocked {code}")
+    return unlocked
+
+
+def evaluateBadges(userId: int, facts: dict) -> list:
+    """
+    Checks every rule in BADGE_RULES against `facts` in one pass and
+    writes all new unlocks in a single batch. Rules for badges the user
+    already holds are skipped without touching the DB.
+
+    facts: e.g. {"bossHp": 0, "streak": 3, "hasWorkout": True}
+    Returns the codes unlocked by this call.
+    """
+    catalog = badgeCatalog()
+    held = _unlockedBadgeIds(userId)
+
+    earned = []
+    for code, (fact, rule) in BADGE_RULES.items():
+        row = catalog.get(code)
+        if row is None or row["badgeId"] in held or fact not in facts:
+            continue
+        if rule(facts[fact]):
+            earned.append(code)
+
+    return _unlockBadgeCodes(userId, earned) if earned else []
+
+
+def unlockBadge(userId: int, code: str):
+    return bool(_unlockBadgeCodes(userId, [code]))
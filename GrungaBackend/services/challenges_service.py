@@ -1,8 +1,10 @@
 from datetime import datetime, timedelta
 import pytz
 from services.connection import db_cursor
-from services.points_service import recomputeTotalsForUser
+from services.points_service import applyPointsDelta, queueTotalsBadges
 from services.connection import execute
+from services.http_cache import bumpUserRevision
+from services.events_service import publishAfterCommit
 
 # -------------------------------------------------------------------
 # Helpers
@@ -52,6 +54,23 @@ def create_challenge(fromUserId, toUserId, exerciseType, sets, reps):
             )
             VALUES (%s, %s, %s, %s, %s, %s, 'PENDING', NOW(), %s)
         """, (fromUserId, toUserId, exerciseType, sets, reps, pts, dueAt))
+        challengeId = db.lastRowId()
+        bumpUserRevision(db, fromUserId, toUserId)
+
+    # Both revisions were bumped, so both sides get the event
+    event = {
+        "challengeId": challengeId,
+        "fromUserId": fromUserId,
+        "toUserId": toUserId,
+        "exerciseType": exerciseType,
+        "sets": sets,
+        "reps": reps,
+        "points": pts,
+        "status": "PENDING",
+        "dueAt": dueAt.replace(tzinfo=None).isoformat(),
+    }
+    for uid in (fromUserId, toUserId):
+        publishAfterCommit(uid, "challenge", event)
 
     return {"ok": True, "points": pts}
 
@@ -63,6 +82,9 @@ def create_challenge(fromUserId, toUserId, exerciseType, sets, reps):
 def get_challenges_for_user(userId, box):
     """
     box = 'incoming' | 'active' | 'done'
+
+    Overdue PENDING rows are left out even if the expiry sweep
+    (scheduler_service.expireChallenges) hasn't reached them yet.
     """
 
     with db_cursor() as db:
@@ -72,6 +94,7 @@ def get_challenges_for_user(userId, box):
                 FROM challenges
                 WHERE toUserId = %s
                   AND status = 'PENDING'
+                  AND dueAt > NOW()
                 ORDER BY createdAt DESC
             """, (userId,))
         elif box == "active":
@@ -97,53 +120,176 @@ def get_challenges_for_user(userId, box):
 
 
 # -------------------------------------------------------------------
-# ACCEPT / DECLINE
+# INBOX (all three boxes + counts in one round trip)
 # -------------------------------------------------------------------
 
-def accept_challenge(challengeId, userId):
+# Columns the challenges page renders
+INBOX_COLUMNS = "challengeId, fromUserId, toUserId, exerciseType, sets, reps, points, status, createdAt, dueAt"
+
+
+def get_challenge_inbox(userId, doneLimit=50, doneAfter=None):
+    """
+    incoming / active / done boxes plus counts for the badges, from one
+    UNION ALL query. Every branch filters on one side of the pair so it can
+    use idx_challenges_to_status / idx_challenges_from_status.
+
+    The done box is keyset paged on (createdAt, challengeId) DESC:
+    doneAfter is the last row's (createdAt, challengeId) from the previous
+    page. Returns {"incoming", "active", "done", "counts", "doneNext"};
+    doneNext is that key for the next page or None.
+    """
+    doneKey = ""
+    doneParams = ()
+    if doneAfter:
+        doneKey = "AND (createdAt < %s OR (createdAt = %s AND challengeId < %s))"
+        doneParams = (doneAfter[0], doneAfter[0], doneAfter[1])
+
+    # Both done branches fetch doneLimit + 1 so the merged page knows if
+    # there is more; the count branch pads the row shape with NULLs.
+    padding = ", ".join(["NULL"] * (INBOX_COLUMNS.count(",")))
     with db_cursor() as db:
-        db.execute("SELECT toUserId, status FROM challenges WHERE challengeId=%s", (challengeId,))
-        row = db.fetchOne()
+        db.execute(f"""
+            (SELECT 'incoming' AS box, {INBOX_COLUMNS}
+             FROM challenges
+             WHERE toUserId = %s AND status = 'PENDING' AND dueAt > NOW())
+            UNION ALL
+            (SELECT 'active', {INBOX_COLUMNS}
+             FROM challenges
+             WHERE toUserId = %s AND status = 'ACTIVE')
+            UNION ALL
+            (SELECT 'active', {INBOX_COLUMNS}
+             FROM challenges
+             WHERE fromUserId = %s AND status = 'ACTIVE')
+            UNION ALL
+            (SELECT 'done', {INBOX_COLUMNS}
+             FROM challenges
+             WHERE toUserId = %s AND status = 'COMPLETED' {doneKey}
+             ORDER BY createdAt DESC, challengeId DESC
+             LIMIT %s)
+            UNION ALL
+            (SELECT 'done', {INBOX_COLUMNS}
+             FROM challenges
+             WHERE fromUserId = %s AND status = 'COMPLETED' {doneKey}
+             ORDER BY createdAt DESC, challengeId DESC
+             LIMIT %s)
+            UNION ALL
+            (SELECT 'doneCount',
+                    (SELECT COUNT(*) FROM challenges WHERE toUserId = %s AND status = 'COMPLETED')
+                  + (SELECT COUNT(*) FROM challenges WHERE fromUserId = %s AND status = 'COMPLETED'),
+                    {padding})
+        """, (
+            userId, userId, userId,
+            userId, *doneParams, doneLimit + 1,
+            userId, *doneParams, doneLimit + 1,
+            userId, userId,
+        ))
+        rows = db.fetchAll() or []
+
+    boxes = {"incoming": [], "active": [], "done": []}
+    doneCount = 0
+    for r in rows:
+        box = r.pop("box")
+        if box == "doneCount":
+            doneCount = int(r["challengeId"])
+        else:
+            boxes[box].append(r)
+
+    newestFirst = lambda ch: (ch["createdAt"], ch["challengeId"])
+    for box in boxes.values():
+        box.sort(key=newestFirst, reverse=True)
+
+    done = boxes["done"]
+    doneNext = None
+    if len(done) > doneLimit:
+        done = done[:doneLimit]
+        doneNext = newestFirst(done[-1])
+
+    return {
+        "incoming": boxes["incoming"],
+        "active": boxes["active"],
+        "done": done,
+        "counts": {
+            "incoming": len(boxes["incoming"]),
+            "active": len(boxes["active"]),
+            "done": doneCount,
+        },
+        "doneNext": doneNext,
+    }
+
+
+# -------------------------------------------------------------------
+# ACCEPT / DECLINE
+# -------------------------------------------------------------------
+
+def _transitionError(db, challengeId, userId, action, fromStatus):
+    """
+    Explains why a conditional status UPDATE matched no row. Only runs on
+    the failure path, on the same connection.
+    """
+    db.execute("""
+        SELECT toUserId, status, dueAt <= NOW() AS overdue
+        FROM challenges
+        WHERE challengeId=%s
+    """, (challengeId,))
+    row = db.fetchOne()
 
     if not row:
         return {"ok": False, "error": "Challenge not found."}
 
     if row["toUserId"] != userId:
-        return {"ok": False, "error": "You cannot accept this challenge."}
+        if action == "complete":
+            return {"ok": False, "error": "Only the receiver can complete this challenge."}
+        return {"ok": False, "error": f"You cannot {action} this challenge."}
+
+    if fromStatus == "PENDING" and (row["status"] == "EXPIRED" or (row["status"] == "PENDING" and row["overdue"])):
+        return {"ok": False, "error": "Challenge has expired."}
+
+    if fromStatus == "ACTIVE":
+        return {"ok": False, "error": "Challenge is not active."}
+    return {"ok": False, "error": "Challenge is not pending."}
 
-    if row["status"] != "PENDING":
-        return {"ok": False, "error": "Challenge is not pending."}
 
+def _notifyParticipants(db, challengeId, status):
+    # Both sides' challenge lists changed: bump their revision (ETags)
+    # and push the new status once committed.
+    db.execute("SELECT fromUserId, toUserId FROM challenges WHERE challengeId=%s", (challengeId,))
+    row = db.fetchOne()
+    bumpUserRevision(db, row["fromUserId"], row["toUserId"])
+    for uid in (row["fromUserId"], row["toUserId"]):
+        publishAfterCommit(uid, "challenge", {"challengeId": challengeId, "status": status})
+
+
+def accept_challenge(challengeId, userId):
+    # The WHERE clause is the state check: only one concurrent caller can
+    # move the row out of PENDING.
     with db_cursor(commit=True) as db:
         db.execute("""
             UPDATE challenges
             SET status = 'ACTIVE'
             WHERE challengeId = %s
-        """, (challengeId,))
+              AND toUserId = %s
+              AND status = 'PENDING'
+              AND dueAt > NOW()
+        """, (challengeId, userId))
+        if db.rowCount() != 1:
+            return _transitionError(db, challengeId, userId, "accept", "PENDING")
+        _notifyParticipants(db, challengeId, "ACTIVE")
 
     return {"ok": True}
 
 
 def decline_challenge(challengeId, userId):
-    with db_cursor() as db:
-        db.execute("SELECT toUserId, status FROM challenges WHERE challengeId=%s", (challengeId,))
-        row = db.fetchOne()
-
-    if not row:
-        return {"ok": False, "error": "Challenge not found."}
-
-    if row["toUserId"] != userId:
-        return {"ok": False, "error": "You cannot decline this challenge."}
-
-    if row["status"] != "PENDING":
-        return {"ok": False, "error": "Challenge is not pending."}
-
     with db_cursor(commit=True) as db:
         db.execute("""
             UPDATE challenges
             SET status = 'DECLINED'
-            WHERE challengeId=%s
-        """, (challengeId,))
+            WHERE challengeId = %s
+              AND toUserId = %s
+              AND status = 'PENDING'
+        """, (challengeId, userId))
+        if db.rowCount() != 1:
+            return _transitionError(db, challengeId, userId, "decline", "PENDING")
+        _notifyParticipants(db, challengeId, "DECLINED")
 
     return {"ok": True}
 
@@ -155,51 +301,55 @@ def decline_challenge(challengeId, userId):
 def complete_challenge(challengeId, userId):
     """
     Completer gets x2 points, sender gets x1.
+
+    The ACTIVE -> COMPLETED update, the ledger rows and both users' totals
+    are one transaction. The conditional UPDATE row-locks the challenge, so
+    concurrent completes serialize on it and only the first one awards.
     """
-    with db_cursor() as db:
+    with db_cursor(commit=True) as db:
+        db.execute("""
+            UPDATE challenges
+            SET status = 'COMPLETED'
+            WHERE challengeId = %s
+              AND toUserId = %s
+              AND status = 'ACTIVE'
+        """, (challengeId, userId))
+        if db.rowCount() != 1:
+            return _transitionError(db, challengeId, userId, "complete", "ACTIVE")
+
         db.execute("""
-            SELECT fromUserId, toUserId, points, status
+            SELECT fromUserId, toUserId, points
             FROM challenges
             WHERE challengeId=%s
         """, (challengeId,))
         row = db.fetchOne()
 
-    if not row:
-        return {"ok": False, "error": "Challenge not found."}
-
-    if row["status"] != "ACTIVE":
-        return {"ok": False, "error": "Challenge is not active."}
+        fromId = row["fromUserId"]
+        toId = row["toUserId"]
+        pts = int(row["points"])
+        for uid in (fromId, toId):
+            publishAfterCommit(uid, "challenge", {"challengeId": challengeId, "status": "COMPLETED"})
 
-    fromId = row["fromUserId"]
-    toId = row["toUserId"]
-    pts = int(row["points"])
+        completer_points = pts * 2
+        sender_points = pts * 1
 
-    # Only receiver can complete
-    if userId != toId:
-        return {"ok": False, "error": "Only the receiver can complete this challenge."}
-
-    completer_points = pts * 2
-    sender_points = pts * 1
-
-    with db_cursor(commit=True) as db:
-        db.execute("""
+        db.executemany("""
             INSERT INTO pointsLedger (userId, points, reason, refId)
-            VALUES (%s, %s, 'challenge_complete', %s)
-        """, (toId, completer_points, str(challengeId)))
-
-        db.execute("""
-            INSERT INTO pointsLedger (userId, points, reason, refId)
-            VALUES (%s, %s, 'challenge_reward_sender', %s)
-        """, (fromId, sender_points, str(challengeId)))
-
-        db.execute("""
-            UPDATE challenges
-            SET status = 'COMPLETED'
-            WHERE challengeId=%s
-        """, (challengeId,))
-
-    # Recompute totals so UI updates instantly
-    recomputeTotalsForUser(toId)
-    recomputeTotalsForUser(fromId)
-
-    return {"ok": True, "message": "Challenge completed."}
\ No newline at end of file
+            VALUES (%s, %s, %s, %s)
+        """, [
+            (toId, completer_points, "challenge_complete", str(challengeId)),
+            (fromId, sender_points, "challenge_reward_sender", str(challengeId)),
+        ])
+
+        # Apply the awards to both users' totals in the same transaction.
+        # Rows are locked in userId order so concurrent completes can't deadlock.
+        today = now_chicago().date()
+        awards = {toId: completer_points, fromId: sender_points}
+        totals = {}
+        for uid in sorted(awards):
+            totals[uid] = applyPointsDelta(db, uid, [(today, awards[uid])])
+
+    for uid, userTotals in totals.items():
+        queueTotalsBadges(uid, userTotals)
+
+    return {"ok": True, "message": "Challenge completed."}
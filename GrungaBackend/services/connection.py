@@ -1,9 +1,15 @@
 import os
 from dotenv import load_dotenv
 import mysql.connector
+from mysql.connector.errors import PoolError
 from mysql.connector.pooling import MySQLConnectionPool
-from datetime import datetime
+from bisect import bisect_right
+from datetime import datetime, timezone
+from flask import g, has_request_context
+import threading
+import time
 import pytz
+from services.metrics_service import recordQuery, recordFetch, recordPoolWait, recordPoolExhausted
 
 load_dotenv()
 
@@ -13,9 +19,7 @@ def _env(name, default=None):
     return value.strip() if isinstance(value, str) else value
 
 
-POOL = MySQLConnectionPool(
-    pool_name="grungaPool",
-    pool_size=int(_env("DB_POOL_SIZE", "8")),
+DB_SETTINGS = dict(
     host=_env("DB_HOST"),
     port=int(_env("DB_PORT", "3306")),
     user=_env("DB_USER"),
@@ -24,54 +28,273 @@ POOL = MySQLConnectionPool(
     autocommit=False,
     charset="utf8mb4",
     collation="utf8mb4_unicode_ci",
-    ssl_disabled=False
+    ssl_disabled=False,
+    # The pure-Python protocol yields to gevent on socket I/O; the C
+    # extension would block every greenlet in the worker during a query.
+    use_pure=_env("DB_USE_PURE", "0") == "1"
 )
 
+CHICAGO_TZ = pytz.timezone("America/Chicago")
+
+# (offset string, DST period index, UTC instant the period ends)
+_tzCache = None
+_tzLock = threading.Lock()
+
+
+class SessionInitPool(MySQLConnectionPool):
+    """
+    MySQLConnectionPool that calls `initSession(cnx)` with the physical
+    connection on every checkout. Sessions are not reset when a
+    connection goes back to the pool, so the hook can skip work that was
+    already done for that connection.
+    """
+
+    def __init__(self, initSession, **kwargs):
+        kwargs["pool_reset_session"] = False
+        super().__init__(**kwargs)
+        self._initSession = initSession
+
+    def get_connection(self):
+        pooled = super().get_connection()
+        try:
+            self._initSession(pooled._cnx)
+        except Exception:
+            pooled.close()
+            raise
+        return pooled
+
 
 def _chicagoOffset():
-    tz = pytz.timezone("America/Chicago")
-    nowCt = datetime.now(tz)
-    off = nowCt.utcoffset()
-    totalMinutes = int(off.total_seconds() // 60)
-    sign = '+' if totalMinutes >= 0 else '-'
-    h = abs(totalMinutes) // 60
-    m = abs(totalMinutes) % 60
-    return f"{sign}{h:02d}:{m:02d}"
+    """
+    Returns (offset, period) for America/Chicago, e.g. ("-06:00", 412).
+    Cached until the next DST transition; `period` changes whenever a
+    transition has happened.
+    """
+    global _tzCache
+    nowUtc = datetime.now(timezone.utc).replace(tzinfo=None)
+    cached = _tzCache
+    if cached is not None and (cached[2] is None or nowUtc < cached[2]):
+        return cached[0], cached[1]
 
+    with _tzLock:
+        transitions = getattr(CHICAGO_TZ, "_utc_transition_times", None) or []
+        period = bisect_right(transitions, nowUtc)
+        until = transitions[period] if period < len(transitions) else None
 
-def getConnection():
-    conn = POOL.get_connection()
-    cur = conn.cursor()
-    cur.execute(f"SET time_zone = '{_chicagoOffset()}'")
-    cur.execute("SET sql_safe_updates = 0")
+        off = datetime.now(CHICAGO_TZ).utcoffset()
+        totalMinutes = int(off.total_seconds() // 60)
+        sign = '+' if totalMinutes >= 0 else '-'
+        h = abs(totalMinutes) // 60
+        m = abs(totalMinutes) % 60
+
+        _tzCache = (f"{sign}{h:02d}:{m:02d}", period, until)
+        return _tzCache[0], _tzCache[1]
+
+
+def _initSession(cnx):
+    """
+    Session settings, applied once per physical connection (and again
+    after a reconnect or a DST transition).
+    """
+    offset, period = _chicagoOffset()
+    state = (cnx.connection_id, period)
+    if getattr(cnx, "_grungaSession", None) == state:
+        return
+
+    cur = cnx.cursor()
+    cur.execute(f"SET time_zone = '{offset}', sql_safe_updates = 0")
     cur.close()
+    cnx._grungaSession = state
+
+
+POOL = SessionInitPool(
+    _initSession,
+    pool_name="grungaPool",
+    pool_size=int(_env("DB_POOL_SIZE", "8")),
+    **DB_SETTINGS
+)
+
+
+# Seconds a checkout keeps retrying an exhausted pool before giving up
+DB_POOL_WAIT = float(_env("DB_POOL_WAIT", "2"))
+
+
+def getConnection():
+    """
+    Pool checkout. mysql-connector fails at once when every connection is
+    in use; this retries for up to DB_POOL_WAIT seconds instead. The wait
+    and any exhaustion are recorded in the metrics.
+    """
+    started = time.perf_counter()
+    exhausted = False
+    while True:
+        try:
+            conn = POOL.get_connection()
+            break
+        except PoolError:
+            if not exhausted:
+                recordPoolExhausted()
+                exhausted = True
+            if time.perf_counter() - started >= DB_POOL_WAIT:
+                raise
+            time.sleep(0.01)
+    recordPoolWait(time.perf_counter() - started)
     return conn
 
 
+def releaseConnection(conn):
+    """
+    Returns a connection to the pool. Sessions are kept between checkouts,
+    so an open (e.g. read-only) transaction is rolled back first rather
+    than leaking its snapshot to the next borrower.
+    """
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+    finally:
+        conn.close()
+
+
+class UnitOfWork:
+    """
+    One pooled connection and one transaction shared by every Db block
+    that runs during a request. The connection is checked out lazily on
+    first use, committed once after the view returns and rolled back /
+    returned to the pool when the request is torn down.
+    """
+
+    def __init__(self):
+        self.conn = None
+        self.dirty = False
+        self.callbacks = []
+
+    def connection(self):
+        if self.conn is None:
+            self.conn = getConnection()
+        return self.conn
+
+    def commit(self):
+        if self.conn is not None and self.dirty:
+            self.conn.commit()
+            self.dirty = False
+
+        callbacks, self.callbacks = self.callbacks, []
+        for fn in callbacks:
+            try:
+                fn()
+            except Exception as e:
+                print(f"[DB] after-commit callback failed: {e}")
+
+    def close(self):
+        self.callbacks = []
+        if self.conn is None:
+            return
+        try:
+            releaseConnection(self.conn)
+        finally:
+            self.conn = None
+            self.dirty = False
+
+
+def currentUnitOfWork():
+    if has_request_context():
+        return g.get("dbUnitOfWork")
+    return None
+
+
+def afterCommit(fn):
+    """
+    Runs `fn` once the current request's transaction has committed, or
+    right away outside a request (call it after the Db block has exited).
+    Use it for in-process caches that must not see rolled-back writes.
+    """
+    uow = currentUnitOfWork()
+    if uow is not None:
+        uow.callbacks.append(fn)
+    else:
+        fn()
+
+
+def initUnitOfWork(app):
+    """
+    Binds a UnitOfWork to flask.g for every request. Responses below 500
+    commit; errors (and anything left uncommitted) roll back on teardown.
+    """
+
+    @app.before_request
+    def _beginUnitOfWork():
+        g.dbUnitOfWork = UnitOfWork()
+
+    @app.after_request
+    def _commitUnitOfWork(response):
+        uow = currentUnitOfWork()
+        if uow is not None and response.status_code < 500:
+            uow.commit()
+        return response
+
+    @app.teardown_request
+    def _endUnitOfWork(exc):
+        uow = g.pop("dbUnitOfWork", None)
+        if uow is not None:
+            uow.close()
+
+
 class Db:
+    """
+    Cursor scope. Inside a request it joins the request's UnitOfWork
+    (commit is deferred to the end of the request); outside a request
+    (scheduler, CLI) it checks out its own connection and commits or
+    rolls back on exit.
+
+    A statement that fails inside a UnitOfWork has no effect on its own
+    (InnoDB statement atomicity); the request's transaction is only
+    rolled back if the error reaches Flask.
+    """
+
     def __init__(self, commit=False):
         self.commit = commit
+        self.uow = None
         self.conn = None
         self.cur = None
 
     def __enter__(self):
-        self.conn = getConnection()
-        self.cur = self.conn.cursor(dictionary=True)
+        self.uow = currentUnitOfWork()
+        if self.uow is not None:
+            self.conn = self.uow.connection()
+            # buffered so several Db blocks can interleave on the shared connection
+            self.cur = self.conn.cursor(dictionary=True, buffered=True)
+        else:
+            self.conn = getConnection()
+            self.cur = self.conn.cursor(dictionary=True)
         return self
 
     def execute(self, sql, params=None):
-        self.cur.execute(sql, params or ())
+        started = time.perf_counter()
+        try:
+            self.cur.execute(sql, params or ())
+        finally:
+            recordQuery(time.perf_counter() - started)
         return self.cur
 
     def executemany(self, sql, seq):
-        self.cur.executemany(sql, seq)
+        started = time.perf_counter()
+        try:
+            self.cur.executemany(sql, seq)
+        finally:
+            recordQuery(time.perf_counter() - started)
         return self.cur
 
     def fetchAll(self):
-        return self.cur.fetchall()
+        started = time.perf_counter()
+        rows = self.cur.fetchall()
+        recordFetch(len(rows) if rows else 0, time.perf_counter() - started)
+        return rows
 
     def fetchOne(self):
-        return self.cur.fetchone()
+        started = time.perf_counter()
+        row = self.cur.fetchone()
+        recordFetch(1 if row else 0, time.perf_counter() - started)
+        return row
 
     def lastRowId(self):
         return self.cur.lastrowid
@@ -80,6 +303,13 @@ class Db:
         return self.cur.rowcount
 
     def __exit__(self, excType, exc, tb):
+        if self.uow is not None:
+            if excType is None and self.commit:
+                self.uow.dirty = True
+            if self.cur is not None:
+                self.cur.close()
+            return
+
         if self.conn is not None:
             if excType is None:
                 if self.commit:
@@ -92,7 +322,40 @@ class Db:
                 self.cur.close()
         finally:
             if self.conn is not None:
-                self.conn.close()
+                releaseConnection(self.conn)
+
+
+def streamRows(sql, params=None, batchSize=1000):
+    """
+    Yields rows from an unbuffered (server-side) cursor, `batchSize` at a
+    time, so memory stays flat however large the result is.
+
+    Always uses its own pool connection, also inside a request: a streamed
+    response body is produced after the request's UnitOfWork is closed.
+    """
+    conn = getConnection()
+    cur = conn.cursor(dictionary=True, buffered=False)
+    try:
+        started = time.perf_counter()
+        cur.execute(sql, params or ())
+        recordQuery(time.perf_counter() - started)
+        while True:
+            started = time.perf_counter()
+            rows = cur.fetchmany(batchSize)
+            recordFetch(len(rows), time.perf_counter() - started)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        try:
+            try:
+                cur.close()
+            except mysql.connector.Error:
+                # client went away mid-stream: drain the rest so the
+                # connection can go back to the pool
+                conn.consume_results()
+        finally:
+            releaseConnection(conn)
 
 
 def db_cursor(commit=False):
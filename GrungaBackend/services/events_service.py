@@ -0,0 +1,192 @@
+from collections import deque
+import json
+import threading
+import time
+from config import (
+    EVENTS_KEEPALIVE,
+    EVENTS_POLL_INTERVAL,
+    EVENTS_MAX_SUBSCRIBERS,
+    EVENTS_BUFFER_SIZE,
+)
+from services.connection import afterCommit, db_cursor as dbCursor
+
+# In-process pub/sub behind GET /api/events/stream.
+#
+# Writes publish after commit to the subscribers of this worker. Writes
+# made by other workers are picked up by a poller that watches
+# userRevisions for the subscribed users and sends them a "sync" event
+# (the client re-fetches; the ETag layer makes that a 304 when nothing it
+# shows changed). Revisions whose change was already published here are
+# noted so the poller doesn't send a second, redundant "sync" for them.
+# Waiting subscribers cost a greenlet each under the gevent worker class,
+# not a thread.
+
+_subscribers = {}          # userId -> set(Subscription)
+_published = {}            # userId -> set(revision) already published here
+_count = 0
+_lock = threading.Lock()
+_poller = None
+
+
+class Subscription:
+    def __init__(self, userId: int):
+        self.userId = userId
+        self.events = deque(maxlen=EVENTS_BUFFER_SIZE)  # oldest dropped if the client lags
+        self.ready = threading.Event()
+
+    def push(self, name: str, data: dict):
+        self.events.append((name, data))
+        self.ready.set()
+
+    def drain(self, timeout: float) -> list:
+        if not self.events:
+            self.ready.wait(timeout)
+        self.ready.clear()
+        out = []
+        while self.events:
+            out.append(self.events.popleft())
+        return out
+
+
+def subscribe(userId: int):
+    """New Subscription for the user, or None if this worker is full."""
+    global _count
+    sub = Subscription(userId)
+    with _lock:
+        if _count >= EVENTS_MAX_SUBSCRIBERS:
+            return None
+        _subscribers.setdefault(userId, set()).add(sub)
+        _count += 1
+    _startPoller()
+    return sub
+
+
+def unsubscribe(sub: Subscription):
+    global _count
+    with _lock:
+        subs = _subscribers.get(sub.userId)
+        if subs and sub in subs:
+            subs.discard(sub)
+            _count -= 1
+            if not subs:
+                del _subscribers[sub.userId]
+
+
+def publish(userId: int, name: str, data: dict):
+    """Delivers an event to the user's subscribers on this worker."""
+    with _lock:
+        subs = list(_subscribers.get(userId, ()))
+    for sub in subs:
+        sub.push(name, data)
+
+
+def publishAfterCommit(userId: int, name: str, data: dict):
+    afterCommit(lambda: publish(userId, name, data))
+
+
+def subscriberCount() -> int:
+    return _count
+
+
+def hasSubscribers(userId: int) -> bool:
+    return userId in _subscribers
+
+
+def notePublishedRevisions(revisions: dict):
+    """
+    {userId: revision} for writes whose events this worker publishes
+    itself; the poller skips "sync" when it only sees those revisions.
+    """
+    with _lock:
+        for uid, rev in revisions.items():
+            if uid in _subscribers:
+                _published.setdefault(uid, set()).add(rev)
+
+
+# -----------------------------------------------------------
+# Cross-worker changes: userRevisions poller
+# -----------------------------------------------------------
+def _pollRevisions(known: dict):
+    with _lock:
+        userIds = list(_subscribers)
+        for uid in list(_published):
+            if uid not in _subscribers:
+                del _published[uid]
+    for uid in list(known):
+        if uid not in _subscribers:
+            del known[uid]
+    if not userIds:
+        return
+
+    for start in range(0, len(userIds), 1000):
+        chunk = userIds[start:start + 1000]
+        placeholders = ", ".join(["%s"] * len(chunk))
+        with dbCursor() as db:
+            db.execute(f"""
+                SELECT userId, revision
+                FROM userRevisions
+                WHERE userId IN ({placeholders})
+            """, tuple(chunk))
+            rows = db.fetchAll() or []
+
+        # No row yet means no counted write yet: revision 0
+        revisions = {r["userId"]: int(r["revision"]) for r in rows}
+        for uid in chunk:
+            rev = revisions.get(uid, 0)
+            with _lock:
+                local = _published.pop(uid, set())
+                later = {r for r in local if r > rev}
+                if later:
+                    _published[uid] = later
+            # No sync if every revision since the last poll was published here
+            prev = known.get(uid)
+            if prev is not None and prev != rev:
+                publishedHere = prev < rev and all(r in local for r in range(prev + 1, rev + 1))
+                if not publishedHere:
+                    publish(uid, "sync", {"revision": rev})
+            known[uid] = rev
+
+
+def _pollLoop():
+    known = {}  # userId -> last revision seen
+    while True:
+        time.sleep(EVENTS_POLL_INTERVAL)
+        try:
+            _pollRevisions(known)
+        except Exception as e:
+            print(f"[EVENTS] Revision poll failed: {e}")
+
+
+def _startPoller():
+    global _poller
+    with _lock:
+        if _poller is None:
+            _poller = threading.Thread(target=_pollLoop, name="events-poller", daemon=True)
+            _poller.start()
+
+
+# -----------------------------------------------------------
+# SSE framing
+# -----------------------------------------------------------
+def _frame(name: str, data: dict) -> str:
+    return f"event: {name}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def eventStream(sub: Subscription, hello: dict):
+    """
+    text/event-stream body for one subscription: a "hello" event, then
+    events as they are published, with a comment line every
+    EVENTS_KEEPALIVE seconds so proxies keep the connection open.
+    Unsubscribes when the client goes away.
+    """
+    try:
+        yield "retry: 5000\n\n"
+        yield _frame("hello", hello)
+        while True:
+            events = sub.drain(EVENTS_KEEPALIVE)
+            if not events:
+                yield ": keepalive\n\n"
+                continue
+            yield "".join(_frame(name, data) for name, data in events)
+    finally:
+        unsubscribe(sub)
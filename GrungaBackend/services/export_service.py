@@ -0,0 +1,111 @@
+import csv
+import io
+import json
+import threading
+from config import EXPORT_MAX_CONCURRENT
+from services.connection import POOL, streamRows
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+# Exports hold a pool connection for the whole download; at least one
+# connection is always left for ordinary requests.
+_exportSlots = threading.BoundedSemaphore(max(1, min(EXPORT_MAX_CONCURRENT, POOL.pool_size - 1)))
+
+# One flat record shape for both workouts and ledger rows
+EXPORT_COLUMNS = [
+    "kind", "id", "userId", "date", "workoutType", "sets", "reps", "points", "reason", "refId",
+]
+
+
+def exportRecords(userId=None):
+    """
+    Workouts, then challenge/points ledger rows, for one user (or everyone
+    when userId is None), as flat dicts with the stored points per row.
+    Rows are read in index order (idx_workouts_user_date /
+    idx_ledger_user_time for one user, primary key for everyone) so the
+    server never has to sort.
+    """
+    if userId is not None:
+        userFilter, params = "WHERE userId = %s", (userId,)
+        workoutOrder, ledgerOrder = "workoutDate, workoutId", "occurredAt, ledgerId"
+    else:
+        userFilter, params = "", ()
+        workoutOrder, ledgerOrder = "workoutId", "ledgerId"
+
+    for r in streamRows(f"""
+        SELECT workoutId, userId, workoutDate, workoutType, sets, reps, points
+        FROM workouts
+        {userFilter}
+        ORDER BY {workoutOrder}
+    """, params):
+        yield {
+            "kind": "workout",
+            "id": r["workoutId"],
+            "userId": r["userId"],
+            "date": r["workoutDate"].isoformat(),
+            "workoutType": r["workoutType"],
+            "sets": r["sets"],
+            "reps": r["reps"],
+            "points": r["points"],
+            "reason": None,
+            "refId": None,
+        }
+
+    for r in streamRows(f"""
+        SELECT ledgerId, userId, occurredAt, points, reason, refId
+        FROM pointsLedger
+        {userFilter}
+        ORDER BY {ledgerOrder}
+    """, params):
+        yield {
+            "kind": "ledger",
+            "id": r["ledgerId"],
+            "userId": r["userId"],
+            "date": r["occurredAt"].isoformat(),
+            "workoutType": None,
+            "sets": None,
+            "reps": None,
+            "points": r["points"],
+            "reason": r["reason"],
+            "refId": r["refId"],
+        }
+
+
+def toNdjson(records):
+    for rec in records:
+        yield json.dumps(rec) + "\n"
+
+
+def toCsv(records):
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    for rec in records:
+        writer.writerow(rec)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate(0)
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def tryStartExport() -> bool:
+    """
+    Claims an export slot without waiting. False when this worker already
+    runs EXPORT_MAX_CONCURRENT exports (the caller answers 503). Release
+    with finishExport(), e.g. via Response.call_on_close.
+    """
+    return _exportSlots.acquire(blocking=False)
+
+
+def finishExport():
+    _exportSlots.release()
+
+
+def exportStream(fmt, userId=None):
+    """Generator of text chunks for `fmt` ('ndjson' | 'csv')."""
+    records = exportRecords(userId)
+    return toCsv(records) if fmt == "csv" else toNdjson(records)
@@ -1,4 +1,92 @@
-from services.connection import db_cursor
+from collections import OrderedDict
+import threading
+import time
+from config import FRIEND_GRAPH_TTL
+from services.connection import db_cursor, afterCommit
+from services.leaderboard_service import invalidateLeaderboards
+from services.search_service import searchUsers as rankedUserSearch
+from services.events_service import publishAfterCommit
+
+# In-process friendship index: userId -> (loadedAt, {otherUserId: {"status", "initiatedBy"}})
+# Loaded lazily per user and updated by the write functions below after
+# commit. Entries expire after FRIEND_GRAPH_TTL seconds so writes made by
+# other workers show up eventually.
+FRIEND_GRAPH_SIZE = 10000
+
+_graph = OrderedDict()
+_graphLock = threading.Lock()
+
+
+def _adjacency(userId):
+    with _graphLock:
+        entry = _graph.get(userId)
+        if entry and time.monotonic() - entry[0] < FRIEND_GRAPH_TTL:
+            _graph.move_to_end(userId)
+            return dict(entry[1])
+
+    # One branch per side of the pair so each can use an index
+    with db_cursor() as db:
+        db.execute("""
+            SELECT userId, friendId, initiatedBy, status
+            FROM friends
+            WHERE userId = %s
+            UNION ALL
+            SELECT userId, friendId, initiatedBy, status
+            FROM friends
+            WHERE friendId = %s
+        """, (userId, userId))
+        rows = db.fetchAll() or []
+
+    edges = {}
+    for row in rows:
+        otherId = row["friendId"] if row["userId"] == userId else row["userId"]
+        edges[otherId] = {"status": row["status"], "initiatedBy": row["initiatedBy"]}
+
+    with _graphLock:
+        _graph[userId] = (time.monotonic(), edges)
+        _graph.move_to_end(userId)
+        while len(_graph) > FRIEND_GRAPH_SIZE:
+            _graph.popitem(last=False)
+    return dict(edges)
+
+
+def _setEdge(userA, userB, status, initiatedBy):
+    with _graphLock:
+        for me, other in ((userA, userB), (userB, userA)):
+            entry = _graph.get(me)
+            if entry:
+                entry[1][other] = {"status": status, "initiatedBy": initiatedBy}
+
+
+def _dropEdge(userA, userB):
+    with _graphLock:
+        for me, other in ((userA, userB), (userB, userA)):
+            entry = _graph.get(me)
+            if entry:
+                entry[1].pop(other, None)
+
+
+def _forgetUsers(*userIds):
+    with _graphLock:
+        for uid in userIds:
+            _graph.pop(uid, None)
+
+
+def _profilesByIds(userIds):
+    """
+    {userId: {userId, username, displayName}} for all ids in one query.
+    """
+    if not userIds:
+        return {}
+    placeholders = ", ".join(["%s"] * len(userIds))
+    with db_cursor() as db:
+        db.execute(f"""
+            SELECT userId, username, displayName
+            FROM users
+            WHERE userId IN ({placeholders})
+        """, tuple(userIds))
+        return {r["userId"]: r for r in db.fetchAll() or []}
+
 
 def getUserByUsername(username):
     with db_cursor() as db:
@@ -9,43 +97,24 @@ def getUserByUsername(username):
         """, (username,))
         return db.fetchOne()
 
-def searchUsers(query, excludeUserId):
-    like = f"%{query}%"
-    with db_cursor() as db:
-        db.execute("""
-            SELECT userId, username, displayName
-            FROM users
-            WHERE (username LIKE %s OR displayName LIKE %s)
-              AND userId <> %s
-            LIMIT 20
-        """, (like, like, excludeUserId))
-        return db.fetchAll()
+def searchUsers(query, excludeUserId, limit=20, offset=0):
+    return rankedUserSearch(query, excludeUserId=excludeUserId, limit=limit, offset=offset)
 
 def getFriendStatus(userId, otherUserId):
     if userId == otherUserId:
         return "self"
 
-    low = min(userId, otherUserId)
-    high = max(userId, otherUserId)
-
-    with db_cursor() as db:
-        db.execute("""
-            SELECT userId, friendId, initiatedBy, status
-            FROM friends
-            WHERE userId = %s AND friendId = %s
-        """, (low, high))
-        row = db.fetchOne()
-
-    if not row:
+    edge = _adjacency(userId).get(otherUserId)
+    if not edge:
         return None
 
-    if row["status"] == "accepted":
+    if edge["status"] == "accepted":
         return "friends"
 
-    if row["status"] == "pending":
-        if row["initiatedBy"] == userId:
+    if edge["status"] == "pending":
+        if edge["initiatedBy"] == userId:
             return "outgoing_pending"
-        elif row["initiatedBy"] == otherUserId:
+        elif edge["initiatedBy"] == otherUserId:
             return "incoming_pending"
 
     # for 'blocked' or anything else, treat as no active relationship
@@ -66,15 +135,33 @@ def sendFriendRequest(fromUserId, toUserId):
     if status == "incoming_pending":
         return {"ok": False, "error": "This user already sent you a request."}
 
-    # status is None => allow new request, overwrite any old blocked/declined entry
+    # status is None => allow new request, overwrite any old blocked/declined entry.
+    # The index above may be stale, so the upsert itself leaves accepted and
+    # pending rows alone (initiatedBy is assigned first, while status still
+    # holds the old value) and the row is read back to see what happened.
     with db_cursor(commit=True) as db:
         db.execute("""
             INSERT INTO friends (userId, friendId, initiatedBy, status)
             VALUES (%s, %s, %s, 'pending')
             ON DUPLICATE KEY UPDATE
-              initiatedBy = VALUES(initiatedBy),
-              status      = VALUES(status)
+              initiatedBy = IF(status IN ('accepted', 'pending'), initiatedBy, VALUES(initiatedBy)),
+              status      = IF(status IN ('accepted', 'pending'), status, VALUES(status))
         """, (low, high, fromUserId))
+        db.execute("""
+            SELECT status, initiatedBy
+            FROM friends
+            WHERE userId = %s AND friendId = %s
+        """, (low, high))
+        row = db.fetchOne()
+
+    if row["status"] != "pending" or row["initiatedBy"] != fromUserId:
+        _forgetUsers(fromUserId, toUserId)
+        if row["status"] == "accepted":
+            return {"ok": False, "error": "You are already friends."}
+        return {"ok": False, "error": "This user already sent you a request."}
+
+    afterCommit(lambda: _setEdge(fromUserId, toUserId, "pending", fromUserId))
+    publishAfterCommit(toUserId, "friend", {"userId": fromUserId, "status": "incoming_pending"})
 
     return {"ok": True}
 
@@ -86,105 +173,73 @@ def respondToFriendRequest(currentUserId, otherUserId, accept):
     low = min(currentUserId, otherUserId)
     high = max(currentUserId, otherUserId)
 
-    with db_cursor() as db:
-        db.execute("""
-            SELECT id, userId, friendId, status
-            FROM friends
-            WHERE userId = %s AND friendId = %s
-        """, (low, high))
-        row = db.fetchOne()
-
-    if not row or row["status"] != "pending":
+    edge = _adjacency(currentUserId).get(otherUserId)
+    if not edge or edge["status"] != "pending":
         return {"ok": False, "error": "No pending friend request found."}
 
-    # (the odd permission check from your original code is kept as-is)
-    if not ((row["userId"] == low and currentUserId == high) or
-            (row["userId"] == low and currentUserId == low and otherUserId == high)):
-        pass
-
     newStatus = "accepted" if accept else "blocked"
 
+    # Conditional on the row still being pending, so a stale index entry
+    # can't flip a relationship that changed in another worker.
     with db_cursor(commit=True) as db:
         db.execute("""
             UPDATE friends
             SET status = %s
-            WHERE id = %s
-        """, (newStatus, row["id"]))
+            WHERE userId = %s AND friendId = %s AND status = 'pending'
+        """, (newStatus, low, high))
+        changed = db.rowCount()
+
+    if not changed:
+        _forgetUsers(currentUserId, otherUserId)
+        return {"ok": False, "error": "No pending friend request found."}
+
+    afterCommit(lambda: _setEdge(currentUserId, otherUserId, newStatus, edge["initiatedBy"]))
+    if accept:
+        afterCommit(lambda: invalidateLeaderboards(currentUserId, otherUserId))
+        publishAfterCommit(otherUserId, "friend", {"userId": currentUserId, "status": "friends"})
 
     return {"ok": True, "status": newStatus}
 
 def getFriendsList(userId):
-    with db_cursor() as db:
-        db.execute("""
-            SELECT f.userId, f.friendId, f.status,
-                   u1.userId AS userAId, u1.username AS userAUsername, u1.displayName AS userADisplayName,
-                   u2.userId AS userBId, u2.username AS userBUsername, u2.displayName AS userBDisplayName
-            FROM friends f
-            JOIN users u1 ON f.userId = u1.userId
-            JOIN users u2 ON f.friendId = u2.userId
-            WHERE f.status = 'accepted'
-              AND (f.userId = %s OR f.friendId = %s)
-        """, (userId, userId))
-        rows = db.fetchAll()
+    friendIds = [
+        otherId for otherId, edge in _adjacency(userId).items()
+        if edge["status"] == "accepted"
+    ]
+    profiles = _profilesByIds(friendIds)
 
     friends = []
-    for row in rows:
-        if row["userAId"] == userId:
-            otherId = row["userBId"]
-            otherUsername = row["userBUsername"]
-            otherDisplayName = row["userBDisplayName"]
-        else:
-            otherId = row["userAId"]
-            otherUsername = row["userAUsername"]
-            otherDisplayName = row["userADisplayName"]
-
+    for otherId in sorted(friendIds):
+        p = profiles.get(otherId)
+        if not p:
+            continue
         friends.append({
             "userId": otherId,
-            "username": otherUsername,
-            "displayName": otherDisplayName
+            "username": p["username"],
+            "displayName": p["displayName"]
         })
 
     return friends
 
 def getPendingRequests(userId):
-    with db_cursor() as db:
-        db.execute("""
-            SELECT f.id,
-                   f.userId,
-                   f.friendId,
-                   f.initiatedBy,
-                   f.status,
-                   u1.username  AS user1Username,
-                   u1.displayName AS user1DisplayName,
-                   u2.username  AS user2Username,
-                   u2.displayName AS user2DisplayName
-            FROM friends f
-            JOIN users u1 ON f.userId = u1.userId
-            JOIN users u2 ON f.friendId = u2.userId
-            WHERE f.status = 'pending'
-              AND (f.userId = %s OR f.friendId = %s)
-        """, (userId, userId))
-        rows = db.fetchAll()
+    pending = {
+        otherId: edge for otherId, edge in _adjacency(userId).items()
+        if edge["status"] == "pending"
+    }
+    profiles = _profilesByIds(list(pending))
 
     incoming = []
     outgoing = []
 
-    for row in rows:
-        # figure out who the "other user" is, for display
-        if row["userId"] == userId:
-            otherId = row["friendId"]
-            otherUsername = row["user2Username"]
-            otherDisplayName = row["user2DisplayName"]
-        else:
-            otherId = row["userId"]
-            otherUsername = row["user1Username"]
-            otherDisplayName = row["user1DisplayName"]
-
-        target_list = outgoing if row["initiatedBy"] == userId else incoming
+    for otherId in sorted(pending):
+        p = profiles.get(otherId)
+        if not p:
+            continue
+
+        target_list = outgoing if pending[otherId]["initiatedBy"] == userId else incoming
         target_list.append({
             "otherUserId": otherId,
-            "username": otherUsername,
-            "displayName": otherDisplayName,
+            "username": p["username"],
+            "displayName": p["displayName"],
         })
 
     return {"incoming": incoming, "outgoing": outgoing}
@@ -203,4 +258,8 @@ def removeFriend(userId, otherUserId):
             WHERE userId = %s AND friendId = %s
         """, (low, high))
 
+    afterCommit(lambda: _dropEdge(userId, otherUserId))
+    publishAfterCommit(otherUserId, "friend", {"userId": userId, "status": None})
+    afterCommit(lambda: invalidateLeaderboards(userId, otherUserId))
+
     return {"ok": True}
@@ -0,0 +1,71 @@
+import hashlib
+from flask import request, make_response
+from services.connection import afterCommit, db_cursor as dbCursor
+from services.events_service import hasSubscribers, notePublishedRevisions
+
+# Cache-Control for per-user reads: browsers keep the body but must
+# revalidate with If-None-Match on every use.
+PRIVATE_REVALIDATE = "private, no-cache"
+
+
+def bumpUserRevision(db, *userIds):
+    """
+    Increments the userRevisions counter for every user whose points,
+    badges or challenges change, inside the caller's transaction. The
+    revision is the version stamp behind the per-user ETags.
+
+    The table has no foreign key to users, so this never waits on the
+    shared locks the caller's own workouts/pointsLedger inserts hold on
+    the users rows. Rows are locked in userId order.
+
+    Callers publish an event to every bumped user. For users subscribed
+    on this worker the new revisions are read back and noted, so the
+    events poller doesn't follow that event with a "sync".
+    """
+    ids = sorted(set(userIds))
+    if not ids:
+        return
+    values = ", ".join(["(%s, 1)"] * len(ids))
+    db.execute(f"""
+        INSERT INTO userRevisions (userId, revision)
+        VALUES {values}
+        ON DUPLICATE KEY UPDATE revision = revision + 1
+    """, tuple(ids))
+
+    watched = [uid for uid in ids if hasSubscribers(uid)]
+    if watched:
+        placeholders = ", ".join(["%s"] * len(watched))
+        db.execute(f"""
+            SELECT userId, revision
+            FROM userRevisions
+            WHERE userId IN ({placeholders})
+        """, tuple(watched))
+        revisions = {r["userId"]: int(r["revision"]) for r in db.fetchAll() or []}
+        afterCommit(lambda: notePublishedRevisions(revisions))
+
+
+def userRevision(userId: int) -> int:
+    """Current revision for the user; 0 until their first counted write."""
+    with dbCursor() as db:
+        db.execute("SELECT revision FROM userRevisions WHERE userId=%s", (userId,))
+        row = db.fetchOne()
+    return int(row["revision"]) if row else 0
+
+
+def makeEtag(*parts) -> str:
+    return hashlib.sha1("|".join(str(p) for p in parts).encode()).hexdigest()[:24]
+
+
+def conditionalResponse(etag: str, build, cacheControl: str = PRIVATE_REVALIDATE):
+    """
+    304 if the request's If-None-Match already has `etag`, otherwise the
+    response from build(). The version stamp behind `etag` must be cheaper
+    to read than build() is to run.
+    """
+    if request.if_none_match.contains_weak(etag):
+        resp = make_response("", 304)
+    else:
+        resp = make_response(build())
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = cacheControl
+    return resp
@@ -0,0 +1,56 @@
+from collections import OrderedDict
+import threading
+import time
+from flask import g, request
+from config import IDENTITY_CACHE_SIZE, IDENTITY_CACHE_TTL, IDENTITY_MISS_TTL
+from services.connection import db_cursor as dbCursor
+
+_cache = OrderedDict()  # username -> (expiresAt, userId or None)
+_lock = threading.Lock()
+
+
+def resolveUserId(username):
+    """
+    username -> userId (None if no such user), through a bounded LRU/TTL
+    cache so the X-Demo-User lookup doesn't hit MySQL on every request.
+    """
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(username)
+        if entry and entry[0] > now:
+            _cache.move_to_end(username)
+            return entry[1]
+
+    with dbCursor() as db:
+        db.execute("SELECT userId FROM users WHERE username = %s", (username,))
+        row = db.fetchOne()
+    userId = row["userId"] if row else None
+
+    ttl = IDENTITY_CACHE_TTL if userId is not None else IDENTITY_MISS_TTL
+    with _lock:
+        _cache[username] = (now + ttl, userId)
+        _cache.move_to_end(username)
+        while len(_cache) > IDENTITY_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return userId
+
+
+def invalidateIdentity(*usernames):
+    """Call when a user is created or renamed."""
+    with _lock:
+        for username in usernames:
+            _cache.pop(username, None)
+
+
+def getCurrentUserId(defaultUsername=None):
+    """
+    The userId named by the X-Demo-User header, resolved once per request
+    and kept on flask.g. Returns None if the header is missing (and no
+    default is given) or the user doesn't exist.
+    """
+    if "currentUserId" in g:
+        return g.currentUserId
+
+    username = request.headers.get("X-Demo-User", defaultUsername)
+    g.currentUserId = resolveUserId(username) if username else None
+    return g.currentUserId
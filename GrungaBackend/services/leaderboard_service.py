@@ -0,0 +1,122 @@
+from collections import OrderedDict, defaultdict
+import threading
+import time
+from config import LEADERBOARD_CACHE_TTL
+from services.connection import db_cursor as dbCursor
+from services.points_service import nowCt, snapshotFromTotalsRow
+
+LEADERBOARD_PERIODS = ("daily", "weekly", "total")
+
+# Max number of users whose friend ranking is cached at once.
+LEADERBOARD_CACHE_SIZE = 10000
+
+_cache = OrderedDict()         # ownerUserId -> (expiresAt, members)
+_owners = defaultdict(set)     # memberUserId -> ownerUserIds whose ranking includes them
+_lock = threading.Lock()
+
+
+def _loadMembers(userId: int) -> list:
+    """
+    The user plus their accepted friends with current totals, in one
+    query against pointsTotals. Each side of the friend pair is its own
+    UNION branch so both can use an index.
+    """
+    with dbCursor() as db:
+        db.execute("""
+            SELECT u.userId, u.username, u.displayName,
+                   pt.dailyPoints, pt.weeklyPoints, pt.totalPoints, pt.updatedAt
+            FROM (
+                SELECT %s AS userId
+                UNION
+                SELECT friendId FROM friends WHERE userId = %s AND status = 'accepted'
+                UNION
+                SELECT userId FROM friends WHERE friendId = %s AND status = 'accepted'
+            ) m
+            JOIN users u ON u.userId = m.userId
+            LEFT JOIN pointsTotals pt ON pt.userId = m.userId
+        """, (userId, userId, userId))
+        rows = db.fetchAll() or []
+
+    now = nowCt()
+    members = []
+    for r in rows:
+        totals = snapshotFromTotalsRow(r if r["updatedAt"] is not None else None, now)
+        members.append({
+            "userId": r["userId"],
+            "username": r["username"],
+            "displayName": r["displayName"],
+            "daily": totals["daily"],
+            "weekly": totals["weekly"],
+            "total": totals["total"],
+        })
+    return members
+
+
+def _cachedMembers(userId: int) -> list:
+    with _lock:
+        entry = _cache.get(userId)
+        if entry and entry[0] > time.monotonic():
+            _cache.move_to_end(userId)
+            return entry[1]
+
+    members = _loadMembers(userId)
+
+    with _lock:
+        _dropLocked(userId)
+        _cache[userId] = (time.monotonic() + LEADERBOARD_CACHE_TTL, members)
+        for m in members:
+            _owners[m["userId"]].add(userId)
+        while len(_cache) > LEADERBOARD_CACHE_SIZE:
+            _dropLocked(next(iter(_cache)))
+    return members
+
+
+def _dropLocked(ownerId: int):
+    entry = _cache.pop(ownerId, None)
+    if entry:
+        for m in entry[1]:
+            owners = _owners.get(m["userId"])
+            if owners:
+                owners.discard(ownerId)
+                if not owners:
+                    del _owners[m["userId"]]
+
+
+def invalidateLeaderboards(*userIds):
+    """
+    Drops every cached ranking that contains any of `userIds` (their own
+    and their friends'). Call after points or friendships change.
+    """
+    with _lock:
+        for uid in userIds:
+            for ownerId in list(_owners.get(uid, ())) + [uid]:
+                _dropLocked(ownerId)
+
+
+def getFriendsLeaderboard(userId: int, period: str = "weekly") -> dict:
+    """
+    Ranks the user and their accepted friends by points for `period`
+    ('daily' | 'weekly' | 'total'). Ties share a rank.
+    """
+    members = sorted(
+        _cachedMembers(userId),
+        key=lambda m: (-m[period], m["username"])
+    )
+
+    entries = []
+    rank = 0
+    prevPoints = None
+    for i, m in enumerate(members, start=1):
+        if m[period] != prevPoints:
+            rank = i
+            prevPoints = m[period]
+        entries.append({
+            "rank": rank,
+            "userId": m["userId"],
+            "username": m["username"],
+            "displayName": m["displayName"],
+            "points": m[period],
+            "isMe": m["userId"] == userId,
+        })
+
+    return {"period": period, "userId": userId, "entries": entries}
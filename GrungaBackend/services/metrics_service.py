@@ -0,0 +1,199 @@
+from bisect import bisect_left
+import threading
+import time
+from flask import g, has_request_context, request
+
+# In-process metrics, rendered in the Prometheus text format at
+# /api/metrics. Series are per worker process; DB work done outside a
+# request (scheduler, background worker, CLI) is labelled "background".
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+BACKGROUND = "background"
+
+_lock = threading.Lock()
+
+# name -> (help, {labels: value})
+_counters = {
+    "grunga_http_requests_total": ("HTTP requests by endpoint, method and status.", {}),
+    "grunga_db_queries_total": ("SQL statements executed.", {}),
+    "grunga_db_rows_total": ("Rows fetched from MySQL.", {}),
+    "grunga_db_pool_exhausted_total": ("Checkouts that found the connection pool exhausted.", {}),
+}
+
+# name -> (help, buckets, {labels: [bucketCounts, sum, count]})
+_histograms = {
+    "grunga_http_request_duration_seconds": ("Time spent in the view, per request.", LATENCY_BUCKETS, {}),
+    "grunga_db_query_duration_seconds": ("Time per SQL statement.", LATENCY_BUCKETS, {}),
+    "grunga_db_time_seconds": ("Total DB time per request.", LATENCY_BUCKETS, {}),
+    "grunga_db_queries_per_request": ("SQL statements per request (N+1 shows up here).", QUERY_COUNT_BUCKETS, {}),
+    "grunga_db_pool_wait_seconds": ("Time to check a connection out of the pool.", LATENCY_BUCKETS, {}),
+}
+
+
+def _inc(name, labels, amount=1):
+    series = _counters[name][1]
+    with _lock:
+        series[labels] = series.get(labels, 0) + amount
+
+
+def _observe(name, labels, value):
+    _, buckets, series = _histograms[name]
+    with _lock:
+        entry = series.get(labels)
+        if entry is None:
+            entry = series[labels] = [[0] * (len(buckets) + 1), 0.0, 0]
+        entry[0][bisect_left(buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+
+# -----------------------------------------------------------
+# Per-request accumulation
+# -----------------------------------------------------------
+class RequestStats:
+    __slots__ = ("started", "queries", "dbTime", "rows", "poolWait")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.dbTime = 0.0
+        self.rows = 0
+        self.poolWait = 0.0
+
+
+def _requestStats():
+    if has_request_context():
+        return g.get("metrics")
+    return None
+
+
+def _endpoint():
+    if not has_request_context():
+        return BACKGROUND
+    return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+
+def recordQuery(seconds: float):
+    endpoint = _endpoint()
+    _inc("grunga_db_queries_total", (endpoint,))
+    _observe("grunga_db_query_duration_seconds", (endpoint,), seconds)
+    stats = _requestStats()
+    if stats is not None:
+        stats.queries += 1
+        stats.dbTime += seconds
+
+
+def recordFetch(rows: int, seconds: float):
+    if rows:
+        _inc("grunga_db_rows_total", (_endpoint(),), rows)
+    stats = _requestStats()
+    if stats is not None:
+        stats.rows += rows
+        stats.dbTime += seconds
+
+
+def recordPoolWait(seconds: float):
+    _observe("grunga_db_pool_wait_seconds", (_endpoint(),), seconds)
+    stats = _requestStats()
+    if stats is not None:
+        stats.poolWait += seconds
+
+
+def recordPoolExhausted():
+    _inc("grunga_db_pool_exhausted_total", (_endpoint(),))
+
+
+def initMetrics(app, serverTiming=False):
+    """
+    Per-request metrics hooks. With serverTiming, responses carry a
+    Server-Timing header (db time + query count, pool wait, total).
+    """
+
+    @app.before_request
+    def _startRequestMetrics():
+        g.metrics = RequestStats()
+
+    @app.after_request
+    def _finishRequestMetrics(response):
+        stats = g.pop("metrics", None)
+        if stats is None:
+            return response
+
+        elapsed = time.perf_counter() - stats.started
+        endpoint = _endpoint()
+        _inc("grunga_http_requests_total", (endpoint, request.method, str(response.status_code)))
+        _observe("grunga_http_request_duration_seconds", (endpoint,), elapsed)
+        _observe("grunga_db_time_seconds", (endpoint,), stats.dbTime)
+        _observe("grunga_db_queries_per_request", (endpoint,), stats.queries)
+
+        if serverTiming:
+            response.headers["Server-Timing"] = (
+                f'db;dur={stats.dbTime * 1000:.1f};desc="{stats.queries} queries, {stats.rows} rows", '
+                f"pool;dur={stats.poolWait * 1000:.1f}, "
+                f"app;dur={elapsed * 1000:.1f}"
+            )
+        return response
+
+
+# -----------------------------------------------------------
+# Prometheus text format
+# -----------------------------------------------------------
+LABEL_NAMES = {
+    "grunga_http_requests_total": ("endpoint", "method", "status"),
+}
+
+
+def _labelText(names, values, extra=""):
+    def esc(v):
+        return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    parts = [f'{n}="{esc(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _gauges():
+    # Imported here: these modules import connection, which imports us
+    from services.worker_service import workerStats
+    from services.events_service import subscriberCount
+    from services.connection import POOL
+
+    worker = workerStats()
+    return [
+        ("grunga_worker_queue_depth", "Side-effect jobs waiting in the background worker.", worker["queued"]),
+        ("grunga_worker_running", "Side-effect jobs running now.", worker["running"]),
+        ("grunga_event_subscribers", "Open /api/events/stream connections.", subscriberCount()),
+        ("grunga_db_pool_size", "Connections in the MySQL pool.", POOL.pool_size),
+    ]
+
+
+def renderPrometheus() -> str:
+    lines = []
+    with _lock:
+        for name, (text, series) in _counters.items():
+            names = LABEL_NAMES.get(name, ("endpoint",))
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in sorted(series.items()):
+                lines.append(f"{name}{_labelText(names, labels)} {value}")
+
+        for name, (text, buckets, series) in _histograms.items():
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, (counts, total, count) in sorted(series.items()):
+                cumulative = 0
+                for le, n in zip(list(buckets) + ["+Inf"], counts):
+                    cumulative += n
+                    leLabel = f'le="{le}"'
+                    lines.append(f"{name}_bucket{_labelText(('endpoint',), labels, leLabel)} {cumulative}")
+                lines.append(f"{name}_sum{_labelText(('endpoint',), labels)} {total}")
+                lines.append(f"{name}_count{_labelText(('endpoint',), labels)} {count}")
+
+    for name, text, value in _gauges():
+        lines.append(f"# HELP {name} {text}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+
+    return "\n".join(lines) + "\n"
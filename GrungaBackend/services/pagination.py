@@ -0,0 +1,41 @@
+import base64
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Response header carrying the cursor for the next page (absent on the last page)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encodeCursor(*parts) -> str:
+    """Opaque keyset cursor from the last row's sort key, e.g. (date, id)."""
+    raw = "|".join(str(p) for p in parts)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decodeCursor(cursor: str, count: int) -> list:
+    """
+    Inverse of encodeCursor; returns `count` string parts.
+    Raises ValueError for a malformed cursor.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        parts = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+    except Exception:
+        raise ValueError("invalid cursor")
+    if len(parts) != count:
+        raise ValueError("invalid cursor")
+    return parts
+
+
+def pageArgs(args, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """
+    (limit, cursor) from request args. Raises ValueError on a bad limit.
+    """
+    try:
+        limit = int(args.get("limit", default))
+    except (TypeError, ValueError):
+        raise ValueError("limit must be an integer")
+    if limit <= 0:
+        raise ValueError("limit must be positive")
+    return min(limit, maximum), (args.get("cursor") or None)
@@ -1,12 +1,16 @@
 from datetime import datetime, timedelta
 import pytz
 from collections import defaultdict
-from services.connection import db_cursor as dbCursor
-from services.badges_service import unlockBadge
+from services.connection import db_cursor as dbCursor, afterCommit
+from services.badges_service import evaluateBadges
+from services.worker_service import submitJob
+from services.http_cache import bumpUserRevision
+from services.events_service import publishAfterCommit
 
 BOSS_MAX_HP = 500
 DAMAGE_PER_POINT = 1
 
+
 def nowCt():
     tz = pytz.timezone("America/Chicago")
     return datetime.now(tz)
@@ -19,148 +23,399 @@ def getBossAssetForWeek(dt: datetime) -> str:
     week_number = dt.isocalendar()[1]
     return "week-boss.png" if week_number % 2 == 0 else "week-boss2.png"
 
+# Points multiplier per workout type; anything not listed scores x1.0.
+#
+# Cardio (reps = duration in minutes, sets = 1):
+# - run, swim: x2.5, bike: x2.0, walk: x1.0
+# Strength (reps = reps, sets = sets):
+# - crunches, lunges, pushups, squats: x1.5
+WORKOUT_MULTIPLIERS = {
+    "run": 2.5,
+    "swim": 2.5,
+    "bike": 2.0,
+    "walk": 1.0,
+    "crunches": 1.5,
+    "lunges": 1.5,
+    "pushups": 1.5,
+    "squats": 1.5,
+}
+
+
+def scoreWorkouts(rows) -> list:
+    """
+    Scores a whole batch of workouts with one table lookup per row.
+
+    rows: iterable of (sets, reps, workoutType) tuples or workout dicts.
+    Returns the points for each row, in order. Points are
+    round(sets * reps * multiplier), never below 0.
+    """
+    lookup = WORKOUT_MULTIPLIERS.get
+    out = []
+    for r in rows:
+        if isinstance(r, dict):
+            sets, reps, workoutType = r["sets"], r["reps"], r["workoutType"]
+        else:
+            sets, reps, workoutType = r
+        out.append(max(0, round(int(sets) * int(reps) * lookup(workoutType, 1.0))))
+    return out
+
+
 def pointsForRow(sets, reps, workoutType):
     """
-    Calculates workout points with realistic multipliers.
-
-    Cardio (reps = duration in minutes, sets = 1):
-    - run, swim: x2.5 multiplier
-    - bike: x2.0 multiplier
-    - walk: x1.0 multiplier
-
-    Strength (reps = reps, sets = sets):
-    - crunches, lunges, pushups, squats: x1.5 multiplier
-    """
-    base_points = int(sets) * int(reps)
-    multiplier = 1.0
-
-    # Determine multiplier based on workout type
-    if workoutType in ["run", "swim"]:
-        # Run and Swim get x2.5
-        multiplier = 2.5
-    elif workoutType == "bike":
-        # Bike gets x2.0
-        multiplier = 2.0
-    elif workoutType == "walk":
-        # Walk gets x1.0 (default, but explicit for clarity)
-        multiplier = 1.0
-    elif workoutType in ["crunches", "lunges", "pushups", "squats"]:
-        # Crunches, lunges, pushups, squats get x1.5
-        multiplier = 1.5
-    
-    # Calculate final points and round to the nearest whole number
-    final_points = round(base_points * multiplier)
-    
-    # Ensure the minimum points is 0
-    return max(0, final_points)
+    Calculates workout points for a single row (see WORKOUT_MULTIPLIERS).
+    The result is stored in workouts.points when the row is written.
+    """
+    return scoreWorkouts([(sets, reps, workoutType)])[0]
+
+
+def _weekRollup(db, userId: int, ws) -> dict:
+    """
+    Reads the user's dailypoints rows for the week starting at `ws`
+    (at most 7 rows) and returns {day: points}.
+    """
+    db.execute("""
+        SELECT day, points
+        FROM dailypoints
+        WHERE userId=%s
+          AND day >= %s
+          AND day < %s
+    """, (userId, ws, ws + timedelta(days=7)))
+    return {r["day"]: int(r["points"]) for r in db.fetchAll() or []}
+
+
+def _afterTotalsChanged(userId: int, totals: dict):
+    # Friends' cached rankings include this user's points.
+    from services.leaderboard_service import invalidateLeaderboards
+    afterCommit(lambda: invalidateLeaderboards(userId))
+    # Sent as the dict stands at commit, i.e. with any streak bump the
+    # caller makes later in the same transaction.
+    publishAfterCommit(userId, "totals", totals)
+
+
+def applyPointsDelta(db, userId: int, deltas) -> dict:
+    """
+    Applies signed point changes to pointsTotals inside the caller's
+    transaction instead of re-scoring the user's whole history.
+
+    deltas: iterable of (day, points) pairs, e.g. [(oldDate, -old), (newDate, new)]
+    The per-day dailypoints rollup is updated write-through, and the
+    daily/weekly totals are read back from it.
+    """
+    now = nowCt()
+    ws = weekStartCt(now).date()
+    today = now.date()
+    yesterday = today - timedelta(days=1)
+
+    byDay = defaultdict(int)
+    for day, pts in deltas:
+        if isinstance(day, datetime):
+            day = day.date()
+        byDay[day] += int(pts)
+
+    db.execute("""
+        SELECT totalPoints, streak, updatedAt
+        FROM pointsTotals
+        WHERE userId=%s
+        FOR UPDATE
+    """, (userId,))
+    row = db.fetchOne()
+
+    if row:
+        last_update = row["updatedAt"].date()
+        total = int(row["totalPoints"])
+        prev_streak = int(row["streak"])
+    else:
+        last_update = None
+        total = prev_streak = 0
+
+    changed = [(userId, day, pts) for day, pts in byDay.items() if pts]
+    if changed:
+        db.executemany("""
+            INSERT INTO dailypoints (userId, day, points)
+            VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE points = points + VALUES(points)
+        """, changed)
+
+    total += sum(byDay.values())
+    week = _weekRollup(db, userId, ws)
+    weekly = sum(week.values())
+    daily = week.get(today, 0)
+
+    # Same streak rule as the full recompute: first active day after a gap
+    # starts a new streak, consecutive days extend it.
+    streak = prev_streak
+    if daily > 0 and last_update != today:
+        streak = prev_streak + 1 if last_update == yesterday else 1
+
+    db.execute("""
+        INSERT INTO pointsTotals (userId, dailyPoints, weeklyPoints, totalPoints, streak)
+        VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+          dailyPoints = VALUES(dailyPoints),
+          weeklyPoints = VALUES(weeklyPoints),
+          totalPoints = VALUES(totalPoints),
+          streak = VALUES(streak),
+          updatedAt = NOW()
+    """, (userId, daily, weekly, total, streak))
+    bumpUserRevision(db, userId)
+
+    totals = {
+        "total": total,
+        "weekly": weekly,
+        "daily": daily,
+        "streak": streak,
+        "boss": bossFromWeekly(weekly, now)
+    }
+    _afterTotalsChanged(userId, totals)
+    return totals
+
+
+def _totalsFacts(totals: dict, facts: dict) -> dict:
+    return {
+        "bossHp": totals["boss"]["hp"],
+        "streak": totals["streak"],
+        **facts
+    }
+
+
+def awardTotalsBadges(userId: int, totals: dict, **facts) -> list:
+    """
+    Runs the badge rules against fresh totals (boss defeated, streak) plus
+    any extra facts, e.g. hasWorkout=True after a workout was logged.
+    """
+    return evaluateBadges(userId, _totalsFacts(totals, facts))
+
+
+def _badgeJob(userId: int, **facts):
+    evaluateBadges(userId, facts)
+
+
+def queueTotalsBadges(userId: int, totals: dict, **facts):
+    """
+    awardTotalsBadges() on the background worker, queued once the current
+    transaction commits. Checks queued for the same user before one runs
+    are merged into a single evaluation with the latest totals.
+    """
+    merged = _totalsFacts(totals, facts)
+    afterCommit(lambda: submitJob("badges", userId, _badgeJob, **merged))
 
 
 def recomputeTotalsForUser(userId: int) -> dict:
+    """
+    Full rebuild of a user's totals from workouts + pointsLedger.
+
+    This is the repair path only (see `flask recompute-totals`); normal
+    writes keep pointsTotals and dailypoints up to date through
+    applyPointsDelta(). The user's dailypoints rollup is rebuilt as well.
+
+    Runs as one transaction that starts by locking the pointsTotals row,
+    the same lock order as applyPointsDelta(): a concurrent write either
+    commits before the sums are read or applies its delta after the
+    rebuild commits, never in between.
+
+    updatedAt means "last active day" to the streak rule, so it only
+    moves to NOW() when the user has points today. If the stored row and
+    rollup already match, nothing is written, the revision isn't bumped
+    and no event is published.
+    """
     now = nowCt()
     ws = weekStartCt(now)
     we = ws + timedelta(days=7)
     today = now.date()
 
-    # ================= WORKOUT POINTS =================
-    with dbCursor() as db:
+    byDay = defaultdict(int)
+
+    with dbCursor(commit=True) as db:
         db.execute("""
-            SELECT sets, reps, workoutType, workoutDate
-            FROM workouts
+            SELECT dailyPoints, weeklyPoints, totalPoints, streak, updatedAt
+            FROM pointsTotals
             WHERE userId=%s
+            FOR UPDATE
         """, (userId,))
-        rows = db.fetchAll() or []
-
-    total = 0
-    weekly = 0
-    daily = 0
-
-    for r in rows:
-        pts = pointsForRow(r["sets"], r["reps"], r["workoutType"])
-        total += pts
-
-        d = r["workoutDate"]
-        if isinstance(d, datetime):
-            d = d.date()
+        row = db.fetchOne()
 
-        if ws.date() <= d < we.date():
-            weekly += pts
-        if d == today:
-            daily += pts
+        # ================= WORKOUT POINTS =================
+        db.execute("""
+            SELECT workoutDate AS day, SUM(points) AS points
+            FROM workouts
+            WHERE userId=%s
+            GROUP BY workoutDate
+        """, (userId,))
+        for r in db.fetchAll() or []:
+            byDay[r["day"]] += int(r["points"])
 
-    # ================= CHALLENGE POINTS =================
-    with dbCursor() as db:
+        # ================= CHALLENGE POINTS =================
         db.execute("""
-            SELECT points, occurredAt
+            SELECT DATE(occurredAt) AS day, SUM(points) AS points
             FROM pointsLedger
             WHERE userId=%s
               AND reason IN ('challenge_complete','challenge_reward_sender')
+            GROUP BY DATE(occurredAt)
         """, (userId,))
-        challenge_rows = db.fetchAll() or []
+        for c in db.fetchAll() or []:
+            byDay[c["day"]] += int(c["points"])
+
+        total = sum(byDay.values())
+        weekly = sum(pts for d, pts in byDay.items() if ws.date() <= d < we.date())
+        daily = byDay.get(today, 0)
+
+        # ================= BOSS CALC =================
+        boss = bossFromWeekly(weekly, now)
+
+        # ================= STREAK LOGIC =================
+        prev_streak = row["streak"] if row else 0
+        last_update = row["updatedAt"].date() if row else None
+
+        didAnythingToday = daily > 0
+        yesterday = today - timedelta(days=1)
+
+        streak = prev_streak
+
+        # Only update streak once per day, and only if we did something today
+        if didAnythingToday and last_update != today:
+            if last_update == yesterday:
+                streak = prev_streak + 1
+            else:
+                streak = 1
+
+        totals = {
+            "total": total,
+            "weekly": weekly,
+            "daily": daily,
+            "streak": streak,
+            "boss": boss
+        }
+
+        # ================= NOTHING TO REPAIR? =================
+        rollup = {d: pts for d, pts in byDay.items() if pts}
+        db.execute("SELECT day, points FROM dailypoints WHERE userId=%s", (userId,))
+        stored = {r["day"]: int(r["points"]) for r in db.fetchAll() or [] if r["points"]}
+        if row and stored == rollup and (
+            int(row["dailyPoints"]), int(row["weeklyPoints"]), int(row["totalPoints"]), int(row["streak"])
+        ) == (daily, weekly, total, streak):
+            return totals
+
+        # ================= SAVE TOTALS + ROLLUP =================
+        db.execute("DELETE FROM dailypoints WHERE userId=%s", (userId,))
+        if rollup:
+            db.executemany("""
+                INSERT INTO dailypoints (userId, day, points)
+                VALUES (%s, %s, %s)
+            """, [(userId, d, pts) for d, pts in sorted(rollup.items())])
+
+        # A new row with no points today is stamped with the last active
+        # day; an existing one keeps its updatedAt (as the rollover does).
+        lastActive = max(rollup) if rollup else None
+        firstStamp = datetime.combine(lastActive, datetime.min.time()) if lastActive else None
+        db.execute("""
+            INSERT INTO pointsTotals (userId, dailyPoints, weeklyPoints, totalPoints, streak, updatedAt)
+            VALUES (%s, %s, %s, %s, %s, IF(%s, NOW(), COALESCE(%s, NOW())))
+            ON DUPLICATE KEY UPDATE
+              dailyPoints = VALUES(dailyPoints),
+              weeklyPoints = VALUES(weeklyPoints),
+              totalPoints = VALUES(totalPoints),
+              streak = VALUES(streak),
+              updatedAt = IF(%s, NOW(), updatedAt)
+        """, (userId, daily, weekly, total, streak, didAnythingToday, firstStamp, didAnythingToday))
+        bumpUserRevision(db, userId)
+
+    _afterTotalsChanged(userId, totals)
+    awardTotalsBadges(userId, totals)
+    return totals
+
+
+def _recomputeJob(userId: int):
+    recomputeTotalsForUser(userId)
+
+
+def scheduleRecompute(userId: int):
+    """
+    Queues a full recompute for the user on the background worker.
+    A user already waiting in the queue is not queued twice.
+    """
+    submitJob("recompute", userId, _recomputeJob)
+
+
+def snapshotFromTotalsRow(row, now=None) -> dict:
+    """
+    Turns a pointsTotals row into the totals dict used by the API.
+    Daily/weekly values from a row last written on an earlier day/week
+    are reported as 0.
+    """
+    now = now or nowCt()
+    if not row:
+        return {
+            "total": 0,
+            "weekly": 0,
+            "daily": 0,
+            "streak": 0,
+            "boss": bossFromWeekly(0, now)
+        }
+
+    last_update = row["updatedAt"].date() if row.get("updatedAt") else None
+    daily = int(row["dailyPoints"] or 0) if last_update == now.date() else 0
+    weekly = int(row["weeklyPoints"] or 0) if last_update and last_update >= weekStartCt(now).date() else 0
 
-    for c in challenge_rows:
-        pts = int(c["points"])
-        total += pts
-        ts = c["occurredAt"].date()
+    return {
+        "total": int(row["totalPoints"] or 0),
+        "weekly": weekly,
+        "daily": daily,
+        "streak": int(row.get("streak") or 0),
+        "boss": bossFromWeekly(weekly, now)
+    }
 
-        if ws.date() <= ts < we.date():
-            weekly += pts
-        if ts == today:
-            daily += pts
 
-    # ================= BOSS CALC =================
-    boss = bossFromWeekly(weekly, now)
+def totalsSnapshotForUser(userId: int) -> dict:
+    """
+    Read-only totals straight from pointsTotals (no recompute, no writes).
 
-    # -------- Badge: Boss Slayer --------
-    if boss["hp"] <= 0:
-        unlockBadge(userId, "BOSS_SLAYER")
+    If the row is missing a background recompute is queued; the caller
+    still gets the (empty) snapshot. An existing row is not re-checked by
+    age: writes keep it current, the nightly rollover leaves updatedAt
+    alone, and updatedAt is the streak's "last active day".
+    """
+    now = nowCt()
 
-    # ================= STREAK LOGIC =================
     with dbCursor() as db:
         db.execute("""
-            SELECT streak, updatedAt
+            SELECT dailyPoints, weeklyPoints, totalPoints, streak, updatedAt
             FROM pointsTotals
             WHERE userId=%s
         """, (userId,))
         row = db.fetchOne()
 
-    prev_streak = row["streak"] if row else 0
-    last_update = row["updatedAt"].date() if row else None
+    if not row:
+        scheduleRecompute(userId)
 
-    didAnythingToday = daily > 0
-    yesterday = today - timedelta(days=1)
+    return snapshotFromTotalsRow(row, now)
 
-    streak = prev_streak
-
-    # Only update streak once per day, and only if we did something today
-    if didAnythingToday and last_update != today:
-        if last_update == yesterday:
-            streak = prev_streak + 1
-        else:
-            streak = 1
 
-    # -------- Badge: 7-day streak --------
-    if streak >= 7:
-        unlockBadge(userId, "STREAK_7")
+def totalsSnapshotsForUsers(userIds) -> dict:
+    """
+    Batch version of totalsSnapshotForUser: {userId: totals} from one
+    pointsTotals IN (...) query.
+    """
+    userIds = list(userIds)
+    if not userIds:
+        return {}
 
-    # ================= SAVE TOTALS =================
-    with dbCursor(commit=True) as db:
-        db.execute("""
-            UPDATE pointsTotals
-            SET dailyPoints=%s,
-                weeklyPoints=%s,
-                totalPoints=%s,
-                streak=%s,
-                updatedAt=NOW()
-            WHERE userId=%s
-        """, (daily, weekly, total, streak, userId))
+    now = nowCt()
+    placeholders = ", ".join(["%s"] * len(userIds))
+    with dbCursor() as db:
+        db.execute(f"""
+            SELECT userId, dailyPoints, weeklyPoints, totalPoints, streak, updatedAt
+            FROM pointsTotals
+            WHERE userId IN ({placeholders})
+        """, tuple(userIds))
+        rows = {r["userId"]: r for r in db.fetchAll() or []}
 
-    return {
-        "total": total,
-        "weekly": weekly,
-        "daily": daily,
-        "streak": streak,
-        "boss": boss
-    }
+    result = {}
+    for uid in userIds:
+        row = rows.get(uid)
+        if not row:
+            scheduleRecompute(uid)
+        result[uid] = snapshotFromTotalsRow(row, now)
+    return result
 
 
 def bossFromWeekly(weekly_points: int, now: datetime) -> dict:
@@ -179,49 +434,40 @@ def bossFromWeekly(weekly_points: int, now: datetime) -> dict:
     }
 
 def weeklyHistogramForUser(userId: int) -> list:
-    now = nowCt()
-    ws = weekStartCt(now)
-    we = ws + timedelta(days=7)
+    """
+    Points per day (Mon..Sun) for the current week, served from the
+    dailypoints rollup.
+    """
+    ws = weekStartCt(nowCt()).date()
 
     with dbCursor() as db:
-        db.execute("""
-            SELECT sets, reps, workoutType, workoutDate
-            FROM workouts
-            WHERE userId=%s
-              AND workoutDate >= %s
-              AND workoutDate < %s
-        """, (userId, ws.date(), we.date()))
-        workout_rows = db.fetchAll() or []
+        byDay = _weekRollup(db, userId, ws)
 
-    from collections import defaultdict
-    byDay = defaultdict(int)
+    return [int(byDay.get(ws + timedelta(days=i), 0)) for i in range(7)]
 
-    for r in workout_rows:
-        d = r["workoutDate"]
-        if isinstance(d, datetime):
-            d = d.date()
-        pts = pointsForRow(r["sets"], r["reps"], r["workoutType"])
-        byDay[d] += pts
 
+def weeklyHistogramsForUsers(userIds) -> dict:
+    """
+    Batch version of weeklyHistogramForUser: {userId: [7 bins]} from one
+    dailypoints query.
+    """
+    userIds = list(userIds)
+    if not userIds:
+        return {}
+
+    ws = weekStartCt(nowCt()).date()
+    placeholders = ", ".join(["%s"] * len(userIds))
     with dbCursor() as db:
-        db.execute("""
-            SELECT points, occurredAt
-            FROM pointsLedger
-            WHERE userId=%s
-              AND reason IN ('challenge_complete','challenge_reward_sender')
-              AND occurredAt >= %s
-              AND occurredAt < %s
-        """, (userId, ws, we))
-        challenge_rows = db.fetchAll() or []
-
-    for c in challenge_rows:
-        ts = c["occurredAt"].date()
-        pts = int(c["points"])
-        byDay[ts] += pts
-
-    bins = []
-    for i in range(7):
-        day = (ws + timedelta(days=i)).date()
-        bins.append(int(byDay.get(day, 0)))
-
-    return bins
\ No newline at end of file
+        db.execute(f"""
+            SELECT userId, day, points
+            FROM dailypoints
+            WHERE userId IN ({placeholders})
+              AND day >= %s
+              AND day < %s
+        """, (*userIds, ws, ws + timedelta(days=7)))
+        rows = db.fetchAll() or []
+
+    bins = {uid: [0] * 7 for uid in userIds}
+    for r in rows:
+        bins[r["userId"]][(r["day"] - ws).days] += int(r["points"])
+    return bins
@@ -1,36 +1,247 @@
 from apscheduler.schedulers.background import BackgroundScheduler
-from services.connection import db_cursor
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import mysql.connector
 import pytz
+from config import (
+    ROLLOVER_CHUNK_SIZE,
+    ROLLOVER_WORKERS,
+    CHALLENGE_EXPIRY_INTERVAL,
+    CHALLENGE_EXPIRY_BATCH,
+    SCHEDULER_ELECTION_INTERVAL,
+)
+from services.connection import db_cursor, DB_SETTINGS
+from services.points_service import nowCt, weekStartCt
+from services.http_cache import bumpUserRevision
+from services.events_service import publish
 
 scheduler = None
 
-# Daily job no longer does streak logic
+# Leader election: every process runs an elector thread; the one whose
+# dedicated connection holds the GET_LOCK runs the jobs. The lock is freed
+# by MySQL when that connection dies, and another elector takes over on
+# its next attempt.
+LEADER_LOCK = f"{DB_SETTINGS['database']}.scheduler"
+HOST_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+_elector = None
+_lockConn = None               # connection holding (or trying for) the lock
+_lockConnGuard = threading.Lock()
+
+
+def rolloverTotalsChunk(lowId, highId, today, weekStart):
+    """
+    Rewrites dailyPoints/weeklyPoints for userIds in [lowId, highId] from
+    the dailypoints rollup in one statement. updatedAt is left untouched
+    so the streak logic still sees the user's last real write.
+    """
+    with db_cursor(commit=True) as db:
+        db.execute("""
+            UPDATE pointsTotals pt
+            LEFT JOIN (
+                SELECT userId,
+                       SUM(points) AS weekly,
+                       SUM(CASE WHEN day = %s THEN points ELSE 0 END) AS daily
+                FROM dailypoints
+                WHERE userId BETWEEN %s AND %s
+                  AND day >= %s
+                  AND day < %s
+                GROUP BY userId
+            ) d ON d.userId = pt.userId
+            SET pt.dailyPoints = COALESCE(d.daily, 0),
+                pt.weeklyPoints = COALESCE(d.weekly, 0),
+                pt.updatedAt = pt.updatedAt
+            WHERE pt.userId BETWEEN %s AND %s
+        """, (today, lowId, highId, weekStart, weekStart + timedelta(days=7), lowId, highId))
+
+
+def rolloverTotals(chunkSize=None, workers=None):
+    """
+    Daily/weekly rollover for every user at the Chicago day boundary,
+    chunked by userId range. With workers > 1 the chunks run in a
+    process pool. Returns {"users", "chunks", "seconds", "usersPerSec"}.
+    """
+    chunkSize = chunkSize or ROLLOVER_CHUNK_SIZE
+    workers = workers or ROLLOVER_WORKERS
+
+    now = nowCt()
+    today = now.date()
+    weekStart = weekStartCt(now).date()
+
+    with db_cursor() as db:
+        db.execute("SELECT MIN(userId) AS lo, MAX(userId) AS hi, COUNT(*) AS n FROM pointsTotals")
+        bounds = db.fetchOne()
+
+    started = time.perf_counter()
+    chunks = []
+    if bounds and bounds["n"]:
+        chunks = [
+            (low, min(low + chunkSize - 1, bounds["hi"]), today, weekStart)
+            for low in range(bounds["lo"], bounds["hi"] + 1, chunkSize)
+        ]
+
+    if workers > 1 and len(chunks) > 1:
+        # spawn: children build their own connection pool instead of
+        # inheriting the parent's sockets
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            list(pool.map(rolloverTotalsChunk, *zip(*chunks)))
+    else:
+        for chunk in chunks:
+            rolloverTotalsChunk(*chunk)
+
+    elapsed = time.perf_counter() - started
+    users = int(bounds["n"]) if bounds else 0
+    rate = users / elapsed if elapsed > 0 else 0.0
+    print(f"[{datetime.now()}] Rolled over totals for {users} users in "
+          f"{len(chunks)} chunks, {elapsed:.2f}s ({rate:.0f} users/sec).")
+
+    return {
+        "users": users,
+        "chunks": len(chunks),
+        "seconds": round(elapsed, 3),
+        "usersPerSec": round(rate, 1)
+    }
+
+
+# Daily job: roll daily/weekly totals over for everyone (no streak logic)
 def resetDailyTasks():
-    print(f"[{datetime.now()}] Daily maintenance run (no streak updates).")
+    return rolloverTotals()
+
+def expireChallenges(batchSize=None):
+    """
+    Marks PENDING challenges past their dueAt as EXPIRED, oldest first, in
+    batches of `batchSize` rows (one short transaction each) using
+    idx_challenges_status_due, and bumps both participants' revision.
+    Returns the number of rows expired.
+    """
+    batchSize = batchSize or CHALLENGE_EXPIRY_BATCH
+    expired = 0
+    while True:
+        with db_cursor(commit=True) as db:
+            db.execute("""
+                SELECT challengeId, fromUserId, toUserId
+                FROM challenges
+                WHERE status = 'PENDING'
+                  AND dueAt <= NOW()
+                ORDER BY dueAt
+                LIMIT %s
+                FOR UPDATE
+            """, (batchSize,))
+            rows = db.fetchAll() or []
+            n = len(rows)
+            if rows:
+                placeholders = ", ".join(["%s"] * n)
+                db.execute(f"""
+                    UPDATE challenges
+                    SET status = 'EXPIRED'
+                    WHERE challengeId IN ({placeholders})
+                """, tuple(r["challengeId"] for r in rows))
+                bumpUserRevision(db, *(uid for r in rows for uid in (r["fromUserId"], r["toUserId"])))
+        for r in rows:
+            for uid in (r["fromUserId"], r["toUserId"]):
+                publish(uid, "challenge", {"challengeId": r["challengeId"], "status": "EXPIRED"})
+        expired += n
+        if n < batchSize:
+            break
+    if expired:
+        print(f"[{datetime.now()}] Expired {expired} challenge(s).")
+    return expired
+
+
+# -------------------------------------------------------------------
+# Job runner + run history
+# -------------------------------------------------------------------
+
+def _isLeader() -> bool:
+    """True if this process's lock connection still owns LEADER_LOCK."""
+    with _lockConnGuard:
+        if _lockConn is None:
+            return False
+        try:
+            cur = _lockConn.cursor()
+            cur.execute("SELECT IS_USED_LOCK(%s) = CONNECTION_ID()", (LEADER_LOCK,))
+            owned = cur.fetchone()[0] == 1
+            cur.close()
+            return owned
+        except mysql.connector.Error:
+            return False
+
+
+def _recordRun(jobId, fn):
+    """
+    Runs a job if this process is still the leader, recording start,
+    finish, duration and outcome in schedulerRuns.
+    """
+    if not _isLeader():
+        print(f"[SCHEDULER] Skipping {jobId}: no longer the leader")
+        return
 
-def expireChallenges():
     with db_cursor(commit=True) as db:
         db.execute("""
-            UPDATE challenges
-            SET status = 'EXPIRED'
-            WHERE status = 'PENDING'
-              AND dueAt <= NOW()
-        """)
-    print(f"[{datetime.now()}] Expired old challenges.")
+            INSERT INTO schedulerRuns (jobId, host, startedAt, status)
+            VALUES (%s, %s, NOW(3), 'running')
+        """, (jobId, HOST_ID))
+        runId = db.lastRowId()
 
-def startScheduler(tz_str="America/Chicago"):
-    global scheduler
+    started = time.perf_counter()
+    status, detail = "ok", None
+    try:
+        result = fn()
+        detail = None if result is None else str(result)
+    except Exception as e:
+        status, detail = "failed", f"{type(e).__name__}: {e}"
+        print(f"[SCHEDULER] {jobId} failed: {detail}")
+    durationMs = int((time.perf_counter() - started) * 1000)
 
-    if scheduler and scheduler.running:
-        return scheduler
+    with db_cursor(commit=True) as db:
+        db.execute("""
+            UPDATE schedulerRuns
+            SET finishedAt = NOW(3), durationMs = %s, status = %s, detail = %s
+            WHERE runId = %s
+        """, (durationMs, status, detail[:500] if detail else None, runId))
+
+
+def _lastSuccess(jobId):
+    with db_cursor() as db:
+        db.execute("""
+            SELECT MAX(startedAt) AS lastOk
+            FROM schedulerRuns
+            WHERE jobId = %s AND status = 'ok'
+        """, (jobId,))
+        row = db.fetchOne()
+    return row["lastOk"] if row else None
+
+
+def recentRuns(limit=20) -> list:
+    with db_cursor() as db:
+        db.execute("""
+            SELECT runId, jobId, host, startedAt, finishedAt, durationMs, status, detail
+            FROM schedulerRuns
+            ORDER BY runId DESC
+            LIMIT %s
+        """, (limit,))
+        return db.fetchAll() or []
+
+
+# -------------------------------------------------------------------
+# Leader election
+# -------------------------------------------------------------------
+
+def _becomeLeader(tz):
+    global scheduler
 
-    tz = pytz.timezone(tz_str)
     scheduler = BackgroundScheduler(timezone=tz)
 
-    # Daily job (no streak logic anymore)
+    # Daily rollover of dailyPoints/weeklyPoints (no streak logic)
     scheduler.add_job(
-        resetDailyTasks,
+        _recordRun,
+        args=("daily_reset", resetDailyTasks),
         trigger="cron",
         hour=0,
         minute=0,
@@ -38,15 +249,111 @@ def startScheduler(tz_str="America/Chicago"):
         replace_existing=True
     )
 
+    # Expiry sweep; reads filter out overdue rows in between, so this only
+    # has to keep the stored status from drifting.
     scheduler.add_job(
-        expireChallenges,
-        trigger="cron",
-        hour=0,
-        minute=0,
+        _recordRun,
+        args=("expire_challenges", expireChallenges),
+        trigger="interval",
+        seconds=CHALLENGE_EXPIRY_INTERVAL,
         id="expire_challenges",
-        replace_existing=True
+        replace_existing=True,
+        coalesce=True,
+        max_instances=1
     )
 
+    # A previous leader may have died before today's rollover ran
+    midnight = datetime.now(tz).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    lastOk = _lastSuccess("daily_reset")
+    if lastOk is None or lastOk < midnight:
+        scheduler.add_job(_recordRun, args=("daily_reset", resetDailyTasks), id="daily_reset_catchup")
+
     scheduler.start()
-    print(f"Scheduler started with timezone {tz_str}")
-    return scheduler
+    print(f"[SCHEDULER] {HOST_ID} is now the leader")
+
+
+def _stepDown():
+    global scheduler
+    if scheduler and scheduler.running:
+        scheduler.shutdown(wait=False)
+        print(f"[SCHEDULER] {HOST_ID} stepped down")
+    scheduler = None
+
+
+def _dropLockConnection():
+    # Closing the session frees GET_LOCK on the server side
+    global _lockConn
+    with _lockConnGuard:
+        try:
+            if _lockConn is not None:
+                _lockConn.close()
+        except mysql.connector.Error:
+            pass
+        _lockConn = None
+
+
+def _electionLoop(tz):
+    global _lockConn
+    leading = False
+    while True:
+        try:
+            with _lockConnGuard:
+                if _lockConn is None or not _lockConn.is_connected():
+                    _lockConn = mysql.connector.connect(**{**DB_SETTINGS, "autocommit": True})
+                cur = _lockConn.cursor()
+                if leading:
+                    cur.execute("SELECT IS_USED_LOCK(%s) = CONNECTION_ID()", (LEADER_LOCK,))
+                else:
+                    cur.execute("SELECT GET_LOCK(%s, 0)", (LEADER_LOCK,))
+                held = cur.fetchone()[0] == 1
+                cur.close()
+        except mysql.connector.Error as e:
+            print(f"[SCHEDULER] Lock connection error: {e}")
+            held = False
+            _dropLockConnection()
+
+        if held and not leading:
+            # Never keep the lock without running the jobs: give it up and
+            # try again next tick (another process may take it first).
+            try:
+                _becomeLeader(tz)
+            except Exception as e:
+                print(f"[SCHEDULER] {HOST_ID} failed to start as leader: {e}")
+                _stepDown()
+                _dropLockConnection()
+                held = False
+        elif leading and not held:
+            _stepDown()
+        leading = held
+
+        time.sleep(SCHEDULER_ELECTION_INTERVAL)
+
+
+def startScheduler(tz_str="America/Chicago"):
+    """
+    Starts this process's elector thread. Safe to call from every
+    gunicorn worker in every container: jobs only run in the one process
+    holding the LEADER_LOCK advisory lock.
+    """
+    global _elector
+
+    if _elector and _elector.is_alive():
+        return _elector
+
+    tz = pytz.timezone(tz_str)
+    _elector = threading.Thread(target=_electionLoop, args=(tz,), name="scheduler-elector", daemon=True)
+    _elector.start()
+    print(f"Scheduler elector started with timezone {tz_str} ({HOST_ID})")
+    return _elector
+
+
+def schedulerStatus() -> dict:
+    return {
+        "host": HOST_ID,
+        "lock": LEADER_LOCK,
+        "leader": bool(scheduler and scheduler.running),
+        "jobs": [
+            {"id": job.id, "nextRun": job.next_run_time.isoformat() if job.next_run_time else None}
+            for job in (scheduler.get_jobs() if scheduler and scheduler.running else [])
+        ],
+    }
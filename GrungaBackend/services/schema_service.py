@@ -0,0 +1,59 @@
+import threading
+from services.connection import db_cursor as dbCursor
+
+# table name (lower case) -> set of column names (lower case)
+_columns = None
+# table name (lower case) -> set of index names (lower case)
+_indexes = None
+_lock = threading.Lock()
+
+
+def refreshSchema() -> dict:
+    """
+    (Re)loads the columns and index names of every table in the current
+    DB from information_schema. Called once at startup; call it again after
+    running a migration against a live process.
+    """
+    global _columns, _indexes
+    with dbCursor() as db:
+        db.execute("""
+            SELECT TABLE_NAME, COLUMN_NAME
+            FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE()
+        """)
+        rows = db.fetchAll() or []
+
+        db.execute("""
+            SELECT DISTINCT TABLE_NAME, INDEX_NAME
+            FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE()
+        """)
+        indexRows = db.fetchAll() or []
+
+    columns = {}
+    for r in rows:
+        columns.setdefault(r["TABLE_NAME"].lower(), set()).add(r["COLUMN_NAME"].lower())
+
+    indexes = {}
+    for r in indexRows:
+        indexes.setdefault(r["TABLE_NAME"].lower(), set()).add(r["INDEX_NAME"].lower())
+
+    with _lock:
+        _columns = columns
+        _indexes = indexes
+    return columns
+
+
+def hasColumn(table: str, column: str) -> bool:
+    """
+    True if `table`.`column` exists. Table names are compared case-
+    insensitively (dumps from Windows hosts lower-case them).
+    """
+    columns = _columns if _columns is not None else refreshSchema()
+    return column.lower() in columns.get(table.lower(), ())
+
+
+def hasIndex(table: str, index: str) -> bool:
+    if _indexes is None:
+        refreshSchema()
+    return index.lower() in _indexes.get(table.lower(), ())
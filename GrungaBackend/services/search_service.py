@@ -0,0 +1,109 @@
+from services.connection import db_cursor as dbCursor
+from services.schema_service import hasIndex
+
+# Name of the ngram FULLTEXT index on users(username, displayName);
+# see database/migrations/003_users_search_index.sql.
+USER_SEARCH_INDEX = "ft_users_search"
+
+# Default ngram_token_size; shorter queries can't use the FULLTEXT index.
+NGRAM_TOKEN_SIZE = 2
+
+MAX_SEARCH_LIMIT = 100
+
+_RANK_SQL = """
+    CASE
+      WHEN username = %s OR displayName = %s THEN 0
+      WHEN username LIKE %s OR displayName LIKE %s THEN 1
+      ELSE 2
+    END
+"""
+
+
+def _escapeLike(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _run(sql, params):
+    with dbCursor() as db:
+        db.execute(sql, params)
+        rows = db.fetchAll() or []
+    for r in rows:
+        r.pop("matchRank", None)
+    return rows
+
+
+def _excludeSql(excludeUserId):
+    return ("AND userId <> %s", (excludeUserId,)) if excludeUserId is not None else ("", ())
+
+
+def searchUsersFulltext(q, fields, excludeUserId, limit, offset):
+    """
+    Candidates from the ngram FULLTEXT index (phrase search, i.e. substring
+    match), then ranked exact > prefix > substring.
+    """
+    prefix = _escapeLike(q) + "%"
+    phrase = '"' + q.replace('"', " ") + '"'
+    exclude, excludeParams = _excludeSql(excludeUserId)
+    return _run(f"""
+        SELECT {fields}, {_RANK_SQL} AS matchRank
+        FROM users
+        WHERE MATCH(username, displayName) AGAINST (%s IN BOOLEAN MODE)
+          {exclude}
+        ORDER BY matchRank, userId
+        LIMIT %s OFFSET %s
+    """, (q, q, prefix, prefix, phrase, *excludeParams, limit, offset))
+
+
+def searchUsersPrefix(q, fields, excludeUserId, limit, offset):
+    """
+    Prefix-only match for queries shorter than the ngram size; served by
+    the username unique key and idx_users_display_name.
+    """
+    prefix = _escapeLike(q) + "%"
+    exclude, excludeParams = _excludeSql(excludeUserId)
+    return _run(f"""
+        SELECT {fields}, {_RANK_SQL} AS matchRank
+        FROM users
+        WHERE (username LIKE %s OR displayName LIKE %s)
+          {exclude}
+        ORDER BY matchRank, userId
+        LIMIT %s OFFSET %s
+    """, (q, q, prefix, prefix, prefix, prefix, *excludeParams, limit, offset))
+
+
+def searchUsersLike(q, fields, excludeUserId, limit, offset):
+    """
+    Fallback when the FULLTEXT index is missing: substring LIKE scan with
+    the same ranking.
+    """
+    prefix = _escapeLike(q) + "%"
+    like = "%" + _escapeLike(q) + "%"
+    exclude, excludeParams = _excludeSql(excludeUserId)
+    return _run(f"""
+        SELECT {fields}, {_RANK_SQL} AS matchRank
+        FROM users
+        WHERE (username LIKE %s OR displayName LIKE %s)
+          {exclude}
+        ORDER BY matchRank, userId
+        LIMIT %s OFFSET %s
+    """, (q, q, prefix, prefix, like, like, *excludeParams, limit, offset))
+
+
+def searchUsers(query, excludeUserId=None, limit=20, offset=0,
+                fields="userId, username, displayName"):
+    """
+    Case-insensitive user search on username/displayName, ranked exact
+    match first, then prefix, then substring (ties by userId).
+    """
+    q = (query or "").strip()
+    if not q:
+        return []
+
+    limit = max(1, min(int(limit), MAX_SEARCH_LIMIT))
+    offset = max(0, int(offset))
+
+    if len(q) < NGRAM_TOKEN_SIZE:
+        return searchUsersPrefix(q, fields, excludeUserId, limit, offset)
+    if hasIndex("users", USER_SEARCH_INDEX):
+        return searchUsersFulltext(q, fields, excludeUserId, limit, offset)
+    return searchUsersLike(q, fields, excludeUserId, limit, offset)
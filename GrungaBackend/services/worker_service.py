@@ -0,0 +1,145 @@
+import atexit
+import threading
+import time
+from collections import OrderedDict
+from config import WORKER_THREADS, WORKER_QUEUE_MAX, WORKER_DRAIN_TIMEOUT
+
+# In-process side-effect queue (badge checks, background recomputes).
+#
+# Jobs are keyed by (kind, userId). Submitting a key that is already
+# waiting merges into that job instead of queueing another one, so a burst
+# of writes by one user costs one run. A key never runs on two threads at
+# once; a submit that arrives while it runs is queued for one more run.
+# Threads start on first use, i.e. after a gunicorn fork.
+
+_pending = OrderedDict()   # (kind, userId) -> [fn, facts]
+_running = set()           # keys being run right now
+_cond = threading.Condition()
+_threads = []
+_accepting = True
+
+_stats = {
+    "submitted": 0,   # jobs queued
+    "coalesced": 0,   # submits merged into a waiting job
+    "dropped": 0,     # not run: queue full or shutting down
+    "completed": 0,
+    "failed": 0,
+    "maxDepth": 0,
+}
+
+
+def _startThreads():
+    # caller holds _cond
+    if _threads:
+        return
+    for i in range(WORKER_THREADS):
+        t = threading.Thread(target=_loop, name=f"side-effects-{i}", daemon=True)
+        t.start()
+        _threads.append(t)
+
+
+def _nextJob():
+    # caller holds _cond; oldest waiting job whose key isn't running
+    for key in _pending:
+        if key not in _running:
+            return key, _pending.pop(key)
+    return None
+
+
+def _loop():
+    while True:
+        with _cond:
+            job = _nextJob()
+            while job is None:
+                if not _accepting and not _pending:
+                    return
+                _cond.wait()
+                job = _nextJob()
+            key, (fn, facts) = job
+            _running.add(key)
+
+        ok = True
+        try:
+            fn(key[1], **facts)
+        except Exception as e:
+            ok = False
+            print(f"[WORKER] {key[0]} job for user {key[1]} failed: {e}")
+        finally:
+            with _cond:
+                _running.discard(key)
+                _stats["completed" if ok else "failed"] += 1
+                _cond.notify_all()
+
+
+def submitJob(kind: str, userId: int, fn, **facts) -> bool:
+    """
+    Queues fn(userId, **facts) on the worker threads. If a (kind, userId)
+    job is still waiting, `facts` are merged into it (later values win)
+    and nothing new is queued.
+
+    When the queue holds WORKER_QUEUE_MAX jobs, or after shutdown has
+    begun, the job is dropped and counted; returns False then. It is never
+    run on the caller's thread: callers submit from request commit hooks
+    and GET reads, where it would join the request's connection. Dropped
+    work is redone later (the next write re-checks badges, the next stale
+    read re-queues its recompute).
+    """
+    key = (kind, userId)
+    with _cond:
+        job = _pending.get(key)
+        if job is not None:
+            job[1].update(facts)
+            _stats["coalesced"] += 1
+            return True
+
+        if _accepting and len(_pending) < WORKER_QUEUE_MAX:
+            _startThreads()
+            _pending[key] = [fn, dict(facts)]
+            _stats["submitted"] += 1
+            _stats["maxDepth"] = max(_stats["maxDepth"], len(_pending))
+            _cond.notify()
+            return True
+
+        _stats["dropped"] += 1
+
+    print(f"[WORKER] Dropped {kind} job for user {userId} (queue full or shutting down)")
+    return False
+
+
+def workerStats() -> dict:
+    """Queue depth and counters since startup."""
+    with _cond:
+        return {
+            "queued": len(_pending),
+            "running": len(_running),
+            "threads": len(_threads),
+            "capacity": WORKER_QUEUE_MAX,
+            "accepting": _accepting,
+            **_stats,
+        }
+
+
+def drainWorker(timeout=None) -> int:
+    """
+    Stops taking new jobs and waits up to `timeout` seconds (default
+    WORKER_DRAIN_TIMEOUT) for queued ones to finish. Returns the number of
+    jobs still waiting. Registered with atexit.
+    """
+    global _accepting
+    deadline = time.monotonic() + (WORKER_DRAIN_TIMEOUT if timeout is None else timeout)
+    with _cond:
+        _accepting = False
+        _cond.notify_all()
+        while _threads and (_pending or _running):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            _cond.wait(remaining)
+        left = len(_pending)
+
+    if left:
+        print(f"[WORKER] Shutdown with {left} job(s) not run")
+    return left
+
+
+atexit.register(drainWorker)
@@ -39,6 +39,18 @@ function buildHeaders(hasBody = false) {
   return headers;
 }
 
+// Server-sent events for the current user (totals, badge, challenge,
+// friend, sync). handlers: { eventName: (data) => ... }. EventSource
+// can't send X-Demo-User, so the user goes in the query string.
+export function openEventStream(handlers) {
+  const url = `${API_BASE}/events/stream?user=${encodeURIComponent(currentUser)}`;
+  const source = new EventSource(url);
+  Object.entries(handlers).forEach(([name, fn]) => {
+    source.addEventListener(name, (e) => fn(JSON.parse(e.data)));
+  });
+  return source;
+}
+
 export async function apiGet(path) {
   const r = await fetch(API_BASE + path, {
     method: "GET",
@@ -49,6 +61,18 @@ export async function apiGet(path) {
   return r.json();
 }
 
+// GET for keyset-paged lists: { rows, nextCursor }, where nextCursor
+// (from X-Next-Cursor) is null on the last page.
+export async function apiGetPage(path) {
+  const r = await fetch(API_BASE + path, {
+    method: "GET",
+    headers: buildHeaders(false),
+    credentials: "omit"
+  });
+  if (!r.ok) throw new Error(`GET ${path} -> ${r.status}`);
+  return { rows: await r.json(), nextCursor: r.headers.get("X-Next-Cursor") };
+}
+
 export async function apiPost(path, body) {
   const r = await fetch(API_BASE + path, {
     method: "POST",
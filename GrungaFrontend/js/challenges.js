@@ -1,4 +1,4 @@
-import { apiGet, apiPost, getCurrentUser } from "./api.js";
+import { apiGet, apiPost, getCurrentUser, openEventStream } from "./api.js";
 
 let currentUserId = null;
 
@@ -137,55 +137,26 @@ function renderChallengeCard(ch, mode) {
 // -------------------------------------------------------
 // LOAD BOXES
 // -------------------------------------------------------
-async function loadIncoming() {
-  const data = await apiGet("/challenges/incoming");
-  incomingListEl.innerHTML = "";
-
-  if (!data || data.length === 0) {
-    buildEmpty(incomingListEl, "No incoming challenges.");
-    return;
-  }
-
-  data.forEach((ch) => {
-    incomingListEl.appendChild(renderChallengeCard(ch, "incoming"));
-  });
-}
-
-async function loadActive() {
-  const data = await apiGet("/challenges/active");
-  activeListEl.innerHTML = "";
-
-  if (!data || data.length === 0) {
-    buildEmpty(activeListEl, "You have no active challenges.");
-    return;
-  }
-
-  data.forEach((ch) => {
-    activeListEl.appendChild(renderChallengeCard(ch, "active"));
-  });
-}
-
-async function loadDone() {
-  const data = await apiGet("/challenges/completed");
-  doneListEl.innerHTML = "";
+function renderBox(listEl, rows, mode, emptyMsg) {
+  listEl.innerHTML = "";
 
-  if (!data || data.length === 0) {
-    buildEmpty(doneListEl, "No completed challenges yet.");
+  if (!rows || rows.length === 0) {
+    buildEmpty(listEl, emptyMsg);
     return;
   }
 
-  data.forEach((ch) => {
-    doneListEl.appendChild(renderChallengeCard(ch, "done"));
+  rows.forEach((ch) => {
+    listEl.appendChild(renderChallengeCard(ch, mode));
   });
 }
 
-
 async function refreshAll() {
-  await Promise.all([
-    loadIncoming(),
-    loadActive(),
-    loadDone(),
-  ]);
+  // One request for all three boxes (done box = newest page)
+  const data = await apiGet("/challenges/inbox");
+
+  renderBox(incomingListEl, data.incoming, "incoming", "No incoming challenges.");
+  renderBox(activeListEl, data.active, "active", "You have no active challenges.");
+  renderBox(doneListEl, data.done, "done", "No completed challenges yet.");
 }
 
 
@@ -244,6 +215,11 @@ async function init() {
     await loadCurrentUser();
     await loadFriendsDropdown();
     await refreshAll();
+    // New incoming / status changes (and changes from other workers)
+    openEventStream({
+      challenge: () => refreshAll(),
+      sync: () => refreshAll(),
+    });
   } catch (err) {
     console.error("Init failed:", err);
   }
@@ -1,4 +1,4 @@
-import { apiGet, getCurrentUser, setCurrentUser } from "./api.js";
+import { apiGet, getCurrentUser, setCurrentUser, openEventStream } from "./api.js";
 
 const greeting = document.getElementById("greeting");
 const totalPointsEl = document.getElementById("total-points");
@@ -169,6 +169,28 @@ async function loadHome() {
 }
 
 
+// ========== LIVE UPDATES (server-sent events) ==========
+let events = null;
+
+function showTotals(t) {
+  const current = (el) => parseInt(el?.textContent, 10) || 0;
+  animateValue(totalPointsEl, current(totalPointsEl), t.total, 600);
+  animateValue(weeklyPointsEl, current(weeklyPointsEl), t.weekly, 600);
+  animateValue(dailyPointsEl, current(dailyPointsEl), t.daily, 600);
+  animateValue(streakEl, current(streakEl), t.streak, 600);
+  updateBossHp(t.boss);
+}
+
+function connectEvents() {
+  if (events) events.close();
+  events = openEventStream({
+    totals: showTotals,
+    // change made through another server worker: re-fetch
+    sync: () => loadHome(),
+  });
+}
+
+
 // ========== USER SWITCHER UI ==========
 function setupUserSwitcher() {
   const btn1 = document.querySelector("[data-user='demo1']");
@@ -199,6 +221,7 @@ function setupUserSwitcher() {
 // Whenever user changes on another page, update automatically
 window.addEventListener("user-changed", () => {
   loadHome();
+  connectEvents();
   setupUserSwitcher();
 });
 
@@ -214,4 +237,5 @@ if (bossArt) {
 window.addEventListener("DOMContentLoaded", () => {
   setupUserSwitcher();
   loadHome();
+  connectEvents();
 });
\ No newline at end of file
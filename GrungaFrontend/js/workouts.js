@@ -1,4 +1,4 @@
-import { apiGet, apiPost, getCurrentUser, setCurrentUser } from "./api.js";
+import { apiGet, apiGetPage, apiPost, getCurrentUser, setCurrentUser } from "./api.js";
 
 document.addEventListener("DOMContentLoaded", async () => {
   const form = document.getElementById("workout-form");
@@ -6,8 +6,11 @@ document.addEventListener("DOMContentLoaded", async () => {
   const durationSection = document.getElementById("duration-section");
   const repsSection = document.getElementById("reps-section");
   const list = document.querySelector("#workout-list ul");
+  const loadMoreBtn = document.getElementById("load-more-workouts");
 
+  const PAGE_SIZE = 50;
   let userId = null;
+  let nextCursor = null;
 
   const cardio = new Set(["run", "bike", "walk", "swim"]);
   const strength = new Set(["pushups", "squats", "lunges", "crunches"]);
@@ -79,8 +82,8 @@ document.addEventListener("DOMContentLoaded", async () => {
   // ======================================================
   // ⭐ FIXED renderRows — now uses formatDate()
   // ======================================================
-  function renderRows(rows) {
-    list.innerHTML = "";
+  function renderRows(rows, append = false) {
+    if (!append) list.innerHTML = "";
 
     (rows || []).forEach((r) => {
       const niceDate = formatDate(r.workoutDate);
@@ -145,12 +148,21 @@ document.addEventListener("DOMContentLoaded", async () => {
   }
 
   // --------------------------------------------------
-  // Load workouts for user
+  // Load workouts for user (newest first, PAGE_SIZE at a time)
   // --------------------------------------------------
-  async function loadWorkouts() {
+  async function loadWorkoutsPage(cursor) {
     if (!userId) await loadUser();
-    const rows = await apiGet(`/users/${userId}/workouts`);
-    renderRows(rows);
+    let path = `/users/${userId}/workouts?limit=${PAGE_SIZE}`;
+    if (cursor) path += `&cursor=${encodeURIComponent(cursor)}`;
+
+    const page = await apiGetPage(path);
+    renderRows(page.rows, Boolean(cursor));
+    nextCursor = page.nextCursor;
+    if (loadMoreBtn) loadMoreBtn.hidden = !nextCursor;
+  }
+
+  async function loadWorkouts() {
+    await loadWorkoutsPage(null);
   }
 
   // --------------------------------------------------
@@ -240,4 +252,9 @@ document.addEventListener("DOMContentLoaded", async () => {
   setupUserSwitcher();
   await reloadAllForCurrentUser();
   form.addEventListener("submit", createWorkout);
+  if (loadMoreBtn) {
+    loadMoreBtn.addEventListener("click", () => {
+      if (nextCursor) loadWorkoutsPage(nextCursor);
+    });
+  }
 });